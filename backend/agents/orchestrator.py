@@ -1,10 +1,12 @@
 import logging
 import asyncio
+from contextlib import aclosing
 from typing import List, Dict, Any
 
 from llm_client import llm_client
+from cascade import cascade_tiers, cascade_stats
 from .schemas import PlanStep, ResearcherOutput, CodeExecutorOutput
-from .utils import extract_json_from_string
+from .utils import StreamingJsonExtractor
 
 class ChiefOrchestrator:
     async def get_next_step(self, user_query: str, history: List[Dict[str, Any]], model_config: Dict[str, Any], clarification_mode: str) -> PlanStep:
@@ -13,14 +15,24 @@ class ChiefOrchestrator:
         prompt = self._get_planner_prompt(user_query, history, clarification_mode)
         messages = [{"role": "user", "content": prompt}]
         
-        try:
-            response_str = await llm_client.chat_completion(model_config, messages)
-            step_json = extract_json_from_string(response_str)
-            validated_step = PlanStep.model_validate(step_json)
-            logging.info(f"Orchestrator: Next step is '{validated_step.agent}' with prompt: '{validated_step.prompt}'")
-            return validated_step
-        except Exception as e:
-            raise Exception(f"The orchestrator LLM failed to determine the next step: {e}")
+        tiers = cascade_tiers(model_config)
+        for index, (tier, config) in enumerate(tiers):
+            try:
+                async with cascade_stats.track(tier):
+                    extractor = StreamingJsonExtractor()
+                    async with aclosing(llm_client.chat_completion_stream(config, messages)) as stream:
+                        async for delta in stream:
+                            extractor.feed(delta)
+                            if extractor.done: break
+                    step_json = extractor.finish()
+                    validated_step = PlanStep.model_validate(step_json)
+                logging.info(f"Orchestrator: Next step is '{validated_step.agent}' with prompt: '{validated_step.prompt}'")
+                return validated_step
+            except Exception as e:
+                if index == len(tiers) - 1:
+                    raise Exception(f"The orchestrator LLM failed to determine the next step: {e}")
+                logging.warning(f"Orchestrator: '{tier}' tier produced an invalid plan step, escalating. Error: {e}")
+                cascade_stats.record_escalation(tier)
 
     def _get_planner_prompt(self, user_query: str, history: List[Dict[str, Any]], clarification_mode: str) -> str:
         history_str = self._format_history(history)
@@ -0,0 +1,70 @@
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from embeddings import tokenize
+from tools.schemas import WebSearchResult
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STEM_LENGTH = 5
+# Pseudo-documents assumed not to contain any prompt term. Without them, IDF over a handful of on-topic results gives the
+# topic's own words (present in every result) almost no weight.
+BACKGROUND_DOCUMENTS = 50
+
+def _stems(text: str) -> List[str]:
+    return [token[:STEM_LENGTH] for token in tokenize(text)]
+
+def _result_stems(result: WebSearchResult) -> List[str]:
+    return _stems(f"{result.title} {result.title} {result.snippet}")
+
+class PrescreenCorpus:
+    # Document frequencies over every search result a research run has seen, so IDF is not computed from one query's results.
+    def __init__(self):
+        self.documents = 0
+        self.document_frequencies: Counter = Counter()
+        self._seen_links = set()
+
+    def add(self, results: Iterable[WebSearchResult]):
+        for result in results:
+            if result.link in self._seen_links: continue
+            self._seen_links.add(result.link)
+            self.documents += 1
+            self.document_frequencies.update(set(_result_stems(result)))
+
+    def idf(self, terms: List[str]) -> np.ndarray:
+        documents = self.documents + BACKGROUND_DOCUMENTS
+        frequencies = np.array([self.document_frequencies[term] for term in terms], dtype=np.float32)
+        return np.log1p((documents - frequencies + 0.5) / (frequencies + 0.5))
+
+def score_search_results(research_prompt: str, results: List[WebSearchResult], corpus: Optional[PrescreenCorpus] = None) -> np.ndarray:
+    query_terms = list(dict.fromkeys(_stems(research_prompt)))
+    if not query_terms:
+        return np.ones(len(results), dtype=np.float32)
+
+    term_index = {term: i for i, term in enumerate(query_terms)}
+    term_frequencies = np.zeros((len(results), len(query_terms)), dtype=np.float32)
+    document_lengths = np.zeros(len(results), dtype=np.float32)
+    for row, result in enumerate(results):
+        stems = _result_stems(result)
+        document_lengths[row] = len(stems)
+        for stem in stems:
+            if stem in term_index:
+                term_frequencies[row, term_index[stem]] += 1
+
+    if corpus is None:
+        corpus = PrescreenCorpus()
+    corpus.add(results)
+    idf = corpus.idf(query_terms)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * document_lengths / max(document_lengths.mean(), 1.0))
+    saturated = term_frequencies * (BM25_K1 + 1) / (term_frequencies + length_norm[:, None])
+    return (saturated @ idf) / ((BM25_K1 + 1) * idf.sum())
+
+def prescreen_results(research_prompt: str, results: List[WebSearchResult], min_score: float, limit: int, corpus: Optional[PrescreenCorpus] = None) -> Tuple[List[Tuple[WebSearchResult, float]], List[Tuple[WebSearchResult, float]]]:
+    scores = score_search_results(research_prompt, results, corpus)
+    ranked = [(results[i], float(scores[i])) for i in np.argsort(-scores, kind="stable")]
+    accepted = [item for item in ranked if item[1] >= min_score][:max(0, limit)]
+    accepted_links = {result.link for result, _ in accepted}
+    rejected = [item for item in ranked if item[0].link not in accepted_links]
+    return accepted, rejected
@@ -1,63 +1,299 @@
 import logging
 import asyncio
-from typing import List, Any, AsyncGenerator, Dict
+import itertools
+import math
+import time
+from collections import Counter
+from contextlib import aclosing
+from typing import List, Any, AsyncGenerator, Dict, Optional, Set, Tuple
 import httpx
 
 from llm_client import llm_client
+from config import (
+    SUMMARY_INDEX_ENABLED, SUMMARY_INDEX_MIN_HITS_TO_SKIP_SEARCH,
+    SUMMARY_BATCH_TOKEN_BUDGET, SUMMARY_BATCH_MAX_DOCUMENTS, SUMMARY_BATCH_LINGER_SECONDS,
+    CASCADE_ESCALATION_THRESHOLD,
+    PRESCREEN_ENABLED, PRESCREEN_MIN_SCORE, PRESCREEN_MAX_PER_QUERY, PRESCREEN_MAX_FETCHES
+)
+from summary_index import summary_index
+from usage import current_usage
+from cascade import cascade_tiers, cascade_stats
 from .schemas import SummarizedContent, ResearcherOutput
-from .utils import extract_json_from_string
+from .utils import extract_json_from_string, StreamingJsonExtractor
+from .prescreen import prescreen_results, PrescreenCorpus
 from tools.schemas import WebSearchResult
+from tools.fetch_scheduler import fetch_scheduler
+
+class ResearchRun:
+    def __init__(self, task_id: int, research_prompt: str, search_model_config: Dict[str, Any], summarize_model_config: Dict[str, Any], client: httpx.AsyncClient, stage_queue_size: int):
+        self.task_id = task_id
+        self.research_prompt = research_prompt
+        self.search_model_config = search_model_config
+        self.summarize_model_config = summarize_model_config
+        self.client = client
+        self.started_at = time.monotonic()
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.query_queue: asyncio.Queue = asyncio.Queue()
+        self.result_queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=stage_queue_size)
+        self.result_sequence = itertools.count()
+        self.content_queue: asyncio.Queue = asyncio.Queue(maxsize=stage_queue_size)
+        self.search_queries: List[str] = []
+        self.seen_urls: Set[str] = set()
+        self.urls_admitted = 0
+        self.urls_skipped = 0
+        self.summaries: List[SummarizedContent] = []
+        self.summarization_round_trips = 0
+        self.summarization_prompt_tokens = 0
+        self.prescreen_corpus = PrescreenCorpus()
 
 class ResearcherAgent:
     def __init__(self):
         self.api_base_url = "http://localhost:8000"
-        self.semaphore = asyncio.Semaphore(5)
+        self.search_concurrency = 5
+        self.fetch_concurrency = 8
+        self.summarize_concurrency = 5
+        self.stage_queue_size = 10
+        self.article_char_limit = 15000
 
     async def run(self, task_id: int, research_prompt: str, search_model_config: Dict[str, Any], summarize_model_config: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
         logging.info(f"ResearcherAgent (Task {task_id}): Starting deep dive research for prompt: '{research_prompt}'")
-        
-        messages = [{"role": "user", "content": self._get_query_generation_prompt(research_prompt)}]
+
+        async with httpx.AsyncClient() as client:
+            run = ResearchRun(task_id, research_prompt, search_model_config, summarize_model_config, client, self.stage_queue_size)
+
+            cached_summaries = summary_index.lookup(research_prompt) if SUMMARY_INDEX_ENABLED else []
+            if cached_summaries:
+                logging.info(f"ResearcherAgent (Task {task_id}): Reusing {len(cached_summaries)} summaries from the local index.")
+                run.seen_urls.update(summary.url for summary in cached_summaries)
+                run.summaries.extend(cached_summaries)
+                yield {"event": "index_hits", "data": {"urls": [summary.url for summary in cached_summaries]}}
+                yield {"event": "urls_found", "data": {"urls": [summary.url for summary in cached_summaries]}}
+                for summary in cached_summaries:
+                    yield {"event": "summary_complete", "data": summary}
+
+            if len(cached_summaries) < SUMMARY_INDEX_MIN_HITS_TO_SKIP_SEARCH:
+                pipeline = asyncio.create_task(self._run_pipeline(run))
+                try:
+                    while True:
+                        event = await run.events.get()
+                        if event is None: break
+                        yield event
+                    await pipeline
+                finally:
+                    if not pipeline.done():
+                        pipeline.cancel()
+                        await asyncio.gather(pipeline, return_exceptions=True)
+
+        if SUMMARY_INDEX_ENABLED:
+            summary_index.add(research_prompt, run.summaries[len(cached_summaries):])
+        highly_relevant_summaries = [summary for summary in run.summaries if summary.relevance_score >= 7]
+        logging.info(f"ResearcherAgent (Task {task_id}): Successfully summarized {len(run.summaries)} URLs in {time.monotonic() - run.started_at:.2f}s using {run.summarization_round_trips} LLM round trips (~{run.summarization_prompt_tokens} prompt tokens); pre-screening skipped {run.urls_skipped} URLs.")
+        yield {"event": "agent_stop", "data": dict(ResearcherOutput(task_id=task_id, summaries=highly_relevant_summaries))}
+
+    async def _run_pipeline(self, run: ResearchRun):
+        workers = []
         try:
-            llm_response = await llm_client.chat_completion(search_model_config, messages)
-            search_queries = extract_json_from_string(llm_response).get("queries", [])
-            if not search_queries: raise ValueError("LLM failed to generate search queries.")
-            yield {"event": "queries_generated", "data": {"queries": search_queries}}
+            search_workers = [asyncio.create_task(self._search_worker(run)) for _ in range(self.search_concurrency)]
+            fetch_workers = [asyncio.create_task(self._fetch_worker(run)) for _ in range(self.fetch_concurrency)]
+            summarize_workers = [asyncio.create_task(self._summarize_worker(run)) for _ in range(self.summarize_concurrency)]
+            workers = search_workers + fetch_workers + summarize_workers
+
+            await self._generate_queries(run)
+            await self._close_stage(run.query_queue, search_workers)
+            await self._close_stage(run.result_queue, fetch_workers, sentinel=(math.inf, 0, None))
+            await self._close_stage(run.content_queue, summarize_workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await run.events.put(None)
+
+    async def _close_stage(self, queue: asyncio.Queue, workers: List[asyncio.Task], sentinel: Any = None):
+        for _ in workers:
+            await queue.put(sentinel)
+        await asyncio.gather(*workers)
+
+    async def _generate_queries(self, run: ResearchRun):
+        messages = [{"role": "user", "content": self._get_query_generation_prompt(run.research_prompt)}]
+
+        async def dispatch_search(query: Any):
+            if not isinstance(query, str) or not query.strip() or query in run.search_queries: return
+            if not run.search_queries:
+                logging.info(f"ResearcherAgent (Task {run.task_id}): First search dispatched {time.monotonic() - run.started_at:.2f}s after step start.")
+            run.search_queries.append(query)
+            await run.query_queue.put(query)
+
+        for tier, config in cascade_tiers(run.search_model_config):
+            try:
+                async with cascade_stats.track(tier):
+                    extractor = StreamingJsonExtractor(array_key="queries")
+                    async with aclosing(llm_client.chat_completion_stream(config, messages)) as stream:
+                        async for delta in stream:
+                            for query in extractor.feed(delta):
+                                await dispatch_search(query)
+                            if extractor.done: break
+                    if not run.search_queries:
+                        for query in extractor.finish().get("queries", []):
+                            await dispatch_search(query)
+                    if not run.search_queries: raise ValueError("LLM failed to generate search queries.")
+                await run.events.put({"event": "queries_generated", "data": {"queries": run.search_queries}})
+                return
+            except Exception as e:
+                if run.search_queries:
+                    # The searches already dispatched still run, so the client has to hear about them.
+                    logging.warning(f"ResearcherAgent (Task {run.task_id}): Query stream failed after {len(run.search_queries)} queries; keeping those. Error: {e}")
+                    await run.events.put({"event": "queries_generated", "data": {"queries": run.search_queries}})
+                    return
+                logging.error(f"ResearcherAgent (Task {run.task_id}): Failed to generate queries with the '{tier}' tier. Error: {e}")
+                cascade_stats.record_escalation(tier)
+
+        logging.error(f"ResearcherAgent (Task {run.task_id}): Falling back to the research prompt as the search query.")
+        await dispatch_search(run.research_prompt)
+        await run.events.put({"event": "queries_generated", "data": {"queries": run.search_queries}})
+
+    async def _search_worker(self, run: ResearchRun):
+        while (query := await run.query_queue.get()) is not None:
+            results = await self._execute_search(run.client, query)
+            new_results = [res for res in {res.link: res for res in results}.values() if res.link not in run.seen_urls]
+            run.seen_urls.update(res.link for res in new_results)
+            if not new_results: continue
+
+            penalized = [res for res in new_results if fetch_scheduler.should_skip(res.link)]
+            if penalized:
+                new_results = [res for res in new_results if res not in penalized]
+                run.urls_skipped += len(penalized)
+                await run.events.put({"event": "urls_skipped", "data": {"urls": [{"url": res.link, "reason": "host_penalized"} for res in penalized]}})
+                if not new_results: continue
+
+            if PRESCREEN_ENABLED:
+                limit = min(PRESCREEN_MAX_PER_QUERY, PRESCREEN_MAX_FETCHES - run.urls_admitted)
+                accepted, rejected = prescreen_results(run.research_prompt, new_results, PRESCREEN_MIN_SCORE, limit, run.prescreen_corpus)
+                new_results = [result for result, _ in accepted]
+                run.urls_skipped += len(rejected)
+                if rejected:
+                    await run.events.put({"event": "urls_skipped", "data": {"urls": [{"url": result.link, "score": round(score, 3)} for result, score in rejected]}})
+                if not new_results: continue
+            usage_tracker = current_usage.get()
+            if usage_tracker and usage_tracker.near_limit:
+                allowed = 0 if usage_tracker.exhausted else 1
+                if len(new_results) > allowed:
+                    run.urls_skipped += len(new_results) - allowed
+                    await run.events.put({"event": "urls_skipped", "data": {"urls": [{"url": res.link, "reason": "budget"} for res in new_results[allowed:]]}})
+                    new_results = new_results[:allowed]
+                if not new_results: continue
+            run.urls_admitted += len(new_results)
+
+            await run.events.put({"event": "urls_found", "data": {"urls": [res.link for res in new_results]}})
+            for result in new_results:
+                await run.result_queue.put((fetch_scheduler.priority(result.link), next(run.result_sequence), result))
+
+    async def _fetch_worker(self, run: ResearchRun):
+        while (result := (await run.result_queue.get())[2]) is not None:
+            content = await self._fetch_content(run.client, result.link)
+            if content:
+                await run.content_queue.put((result, content))
+
+    async def _summarize_worker(self, run: ResearchRun):
+        closing = False
+        while not closing:
+            item = await run.content_queue.get()
+            if item is None: break
+            batch = [item]
+            batch_tokens = self._estimate_tokens(item[1])
+            while SUMMARY_BATCH_TOKEN_BUDGET and len(batch) < SUMMARY_BATCH_MAX_DOCUMENTS:
+                try:
+                    next_item = await asyncio.wait_for(run.content_queue.get(), SUMMARY_BATCH_LINGER_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if next_item is None:
+                    closing = True
+                    break
+                next_tokens = self._estimate_tokens(next_item[1])
+                if batch_tokens + next_tokens > SUMMARY_BATCH_TOKEN_BUDGET:
+                    await self._summarize_batch(run, batch)
+                    batch, batch_tokens = [], 0
+                batch.append(next_item)
+                batch_tokens += next_tokens
+            await self._summarize_batch(run, batch)
+
+    async def _summarize_batch(self, run: ResearchRun, batch: List[Tuple[WebSearchResult, str]]):
+        if not batch: return
+        tiers = cascade_tiers(run.summarize_model_config)
+        summaries: Dict[str, SummarizedContent] = {}
+        pending = batch
+        for index, (tier, config) in enumerate(tiers):
+            tier_summaries = await self._summarize_with_config(run, pending, config, tier)
+            if index == len(tiers) - 1:
+                summaries.update(tier_summaries)
+                break
+            screened_out = {url: summary for url, summary in tier_summaries.items() if summary.relevance_score < CASCADE_ESCALATION_THRESHOLD}
+            summaries.update(screened_out)
+            pending = [item for item in pending if item[0].link not in screened_out]
+            if not pending: break
+            cascade_stats.record_escalation(tier, len(pending))
+
+        for result, _ in batch:
+            summary = summaries.get(result.link)
+            if summary:
+                run.summaries.append(summary)
+                await run.events.put({"event": "summary_complete", "data": summary})
+
+    async def _summarize_with_config(self, run: ResearchRun, batch: List[Tuple[WebSearchResult, str]], model_config: Dict[str, Any], tier: str) -> Dict[str, SummarizedContent]:
+        summaries: Dict[str, SummarizedContent] = {}
+        if len(batch) > 1:
+            summaries = await self._summarize_multiple(run, batch, model_config, tier)
+        missing = [(result, content) for result, content in batch if result.link not in summaries]
+        run.summarization_round_trips += len(missing)
+        run.summarization_prompt_tokens += sum(self._estimate_tokens(content) for _, content in missing)
+        fallbacks = await asyncio.gather(*(self._summarize_content(run.research_prompt, result.link, result.title, content, model_config, tier) for result, content in missing))
+        for (result, _), summary in zip(missing, fallbacks):
+            if summary:
+                summaries[result.link] = summary
+        return summaries
+
+    async def _summarize_multiple(self, run: ResearchRun, batch: List[Tuple[WebSearchResult, str]], model_config: Dict[str, Any], tier: str) -> Dict[str, SummarizedContent]:
+        run.summarization_round_trips += 1
+        run.summarization_prompt_tokens += sum(self._estimate_tokens(content) for _, content in batch)
+        try:
+            messages = [{"role": "user", "content": self._get_batch_summarization_prompt(run.research_prompt, [content for _, content in batch])}]
+            async with cascade_stats.track(tier):
+                llm_output = await llm_client.chat_completion(model_config, messages)
+            items = extract_json_from_string(llm_output).get("summaries", [])
         except Exception as e:
-            logging.error(f"ResearcherAgent (Task {task_id}): Failed to generate queries, falling back. Error: {e}")
-            search_queries = [research_prompt]
+            logging.warning(f"ResearcherAgent: Batched summarization of {len(batch)} URLs failed, falling back to per-URL calls. Error: {e}")
+            return {}
 
-        async with httpx.AsyncClient() as client:
-            search_tasks = [self._execute_search(client, query) for query in search_queries]
-            search_results_lists = await asyncio.gather(*search_tasks)
-        
-        all_results = [item for sublist in search_results_lists for item in sublist]
-        unique_urls = {res.link: res for res in all_results}
-        unique_search_results = list(unique_urls.values())
-        
-        yield {"event": "urls_found", "data": {"urls": list(unique_urls.keys())}}
-        
-        successful_summaries = []
-        if unique_search_results:
-            summary_queue = asyncio.Queue()
-            async with httpx.AsyncClient() as client:
-                summary_tasks = [
-                    asyncio.create_task(self._summarize_and_queue(client, research_prompt, result, summary_queue, summarize_model_config))
-                    for result in unique_search_results
-                ]
-                
-                completed_count = 0
-                while completed_count < len(unique_search_results):
-                    summary = await summary_queue.get()
-                    completed_count += 1
-                    if summary:
-                        successful_summaries.append(summary)
-                        yield {"event": "summary_complete", "data": summary.model_dump()}
-
-                await asyncio.gather(*summary_tasks)
-        
-        highly_relevant_summaries = [summary for summary in successful_summaries if summary.relevance_score >= 7]
-        logging.info(f"ResearcherAgent (Task {task_id}): Successfully summarized {len(successful_summaries)} URLs.")
-        yield {"event": "agent_stop", "data": ResearcherOutput(task_id=task_id, summaries=highly_relevant_summaries).model_dump()}
+        numbered = []
+        for item in items:
+            try:
+                numbered.append((int(item["id"]), item))
+            except Exception as e:
+                logging.warning(f"ResearcherAgent: Skipping malformed batch summary entry {item}. Error: {e}")
+
+        # Articles are numbered from 1 in the prompt. An id outside that range means the model numbered them differently
+        # (usually from 0), so none of its ids can be trusted to point at the right URL.
+        out_of_range = [article_id for article_id, _ in numbered if not 1 <= article_id <= len(batch)]
+        if out_of_range:
+            logging.warning(f"ResearcherAgent: Batch summary used article ids {out_of_range} outside 1-{len(batch)}; summarizing all {len(batch)} URLs individually.")
+            return {}
+
+        id_counts = Counter(article_id for article_id, _ in numbered)
+        for article_id in sorted(article_id for article_id, count in id_counts.items() if count > 1):
+            logging.warning(f"ResearcherAgent: Batch summary returned article {article_id} {id_counts[article_id]} times; summarizing it individually.")
+        summaries = {}
+        for article_id, item in numbered:
+            if id_counts[article_id] > 1: continue
+            result, _ = batch[article_id - 1]
+            try:
+                summaries[result.link] = SummarizedContent.model_validate({"url": result.link, "title": result.title, "summary": item["summary"], "relevance_score": item["relevance_score"]})
+            except Exception as e:
+                logging.warning(f"ResearcherAgent: Skipping malformed batch summary entry {item}. Error: {e}")
+        if len(summaries) < len(batch):
+            logging.warning(f"ResearcherAgent: Batched summarization returned {len(summaries)}/{len(batch)} valid summaries; summarizing the rest individually.")
+        return summaries
+
+    def _estimate_tokens(self, content: str) -> int:
+        return len(content[:self.article_char_limit]) // 4
 
     async def _execute_search(self, client: httpx.AsyncClient, query: str) -> List[WebSearchResult]:
         try:
@@ -68,26 +304,32 @@ class ResearcherAgent:
             logging.error(f"ResearcherAgent: Search failed for query '{query}'. Error: {e}")
             return []
 
-    async def _summarize_and_queue(self, client: httpx.AsyncClient, research_prompt: str, result: WebSearchResult, queue: asyncio.Queue, model_config: Dict[str, Any]):
-        summary = await self._summarize_single_url(client, research_prompt, result.link, result.title, model_config)
-        await queue.put(summary)
-
-    async def _summarize_single_url(self, client: httpx.AsyncClient, research_prompt: str, url: str, title: str, model_config: Dict[str, Any]) -> SummarizedContent | None:
-        async with self.semaphore:
-            try:
-                res = await client.post(f"{self.api_base_url}/v1/tools/read_website", json={"url": url}, timeout=60.0)
-                res.raise_for_status()
-                web_content = res.json()
-                if not web_content.get("content") or "Error" in web_content.get("title", ""): return None
+    async def _fetch_content(self, client: httpx.AsyncClient, url: str) -> Optional[str]:
+        try:
+            res = await client.post(f"{self.api_base_url}/v1/tools/read_website", json={"url": url}, timeout=60.0)
+            res.raise_for_status()
+            web_content = res.json()
+            if not web_content.get("content") or "Error" in web_content.get("title", ""): return None
+            return web_content["content"]
+        except Exception as e:
+            logging.error(f"ResearcherAgent: Failed to fetch URL {url}. Error: {e}")
+            return None
 
-                messages = [{"role": "user", "content": self._get_summarization_prompt(research_prompt, web_content["content"])}]
+    async def _summarize_content(self, research_prompt: str, url: str, title: str, content: str, model_config: Dict[str, Any], tier: str) -> SummarizedContent | None:
+        try:
+            messages = [{"role": "user", "content": self._get_summarization_prompt(research_prompt, content)}]
+            async with cascade_stats.track(tier):
                 llm_output = await llm_client.chat_completion(model_config, messages)
-                summary_json = extract_json_from_string(llm_output)
-                return SummarizedContent.model_validate({"url": url, "title": title, **summary_json})
-            except Exception as e:
-                logging.error(f"ResearcherAgent: Failed to process URL {url}. Error: {e}")
-                return None
+            summary_json = extract_json_from_string(llm_output)
+            return SummarizedContent.model_validate({"url": url, "title": title, **summary_json})
+        except Exception as e:
+            logging.error(f"ResearcherAgent: Failed to summarize URL {url}. Error: {e}")
+            return None
 
     def _get_query_generation_prompt(self, research_prompt: str) -> str: return f'You are a search strategist. Generate a JSON object with a "queries" key, containing a list of 3-5 diverse search queries for the given task. If the task involves a subjective, controversial, or multifaceted topic, ensure your queries cover multiple perspectives (e.g., "pros of X", "cons of X", "social impact of X", "economic impact of X").\n\nTASK: "{research_prompt}"'
-    
-    def _get_summarization_prompt(self, research_prompt: str, article_text: str) -> str: return f'You are a Research Analyst. Read the article and determine its relevance to the research prompt. Your output must be a single JSON object with two keys: "summary" (a concise, fact-based summary) and "relevance_score" (an integer from 0-10).\n\nPROMPT: "{research_prompt}"\n\nARTICLE: "{article_text[:15000]}"'
\ No newline at end of file
+
+    def _get_summarization_prompt(self, research_prompt: str, article_text: str) -> str: return f'You are a Research Analyst. Read the article and determine its relevance to the research prompt. Your output must be a single JSON object with two keys: "summary" (a concise, fact-based summary) and "relevance_score" (an integer from 0-10).\n\nPROMPT: "{research_prompt}"\n\nARTICLE: "{article_text[:self.article_char_limit]}"'
+
+    def _get_batch_summarization_prompt(self, research_prompt: str, article_texts: List[str]) -> str:
+        articles = "\n\n".join(f'ARTICLE {i}: "{text[:self.article_char_limit]}"' for i, text in enumerate(article_texts, start=1))
+        return f'You are a Research Analyst. Read each numbered article independently and determine its relevance to the research prompt. Your output must be a single JSON object with a "summaries" key containing one entry per article, in order. Each entry must have three keys: "id" (the article number), "summary" (a concise, fact-based summary of that article only) and "relevance_score" (an integer from 0-10).\n\nPROMPT: "{research_prompt}"\n\n{articles}'
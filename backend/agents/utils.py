@@ -1,6 +1,7 @@
 import json
 import logging
 import re
+from typing import Optional
 
 def extract_json_from_string(text: str) -> dict:
     try:
@@ -18,4 +19,94 @@ def extract_json_from_string(text: str) -> dict:
         raise json.JSONDecodeError("No JSON object found in the string.", text, 0)
     except Exception as e:
         logging.error(f"Failed to extract JSON from text: {text}. Error: {e}")
-        raise
\ No newline at end of file
+        raise
+
+class StreamingJsonExtractor:
+    def __init__(self, array_key: Optional[str] = None):
+        self.array_key = array_key
+        self.buffer = ""
+        self.result: Optional[dict] = None
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = -1
+        self._array_depth: Optional[int] = None
+        self._item_start = -1
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, delta: str) -> list:
+        self.buffer += delta
+        items = []
+        while self._position < len(self.buffer) and self.result is None:
+            position = self._position
+            char = self.buffer[position]
+            self._position += 1
+
+            if self._depth == 0:
+                if char == '{':
+                    self._object_start = position
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == self._array_depth and self.buffer[self._item_start] == '"':
+                        self._flush_item(position, items)
+                continue
+
+            at_item_level = self._depth == self._array_depth
+            if at_item_level and self._item_start == -1 and not char.isspace() and char not in ',]':
+                self._item_start = position
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if char == '[' and self._depth == 2 and self.array_key and self._key_before(position) == self.array_key:
+                    self._array_depth = 2
+            elif char in '}]':
+                if at_item_level:
+                    self._flush_item(position - 1, items)
+                    self._array_depth = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_object(position)
+            elif char == ',' and at_item_level:
+                self._flush_item(position - 1, items)
+        return items
+
+    def finish(self) -> dict:
+        if self.result is not None:
+            return self.result
+        return extract_json_from_string(self.buffer)
+
+    def _key_before(self, position: int) -> Optional[str]:
+        match = re.search(r'"((?:[^"\\]|\\.)*)"\s*:\s*$', self.buffer[self._object_start:position])
+        return match.group(1) if match else None
+
+    def _flush_item(self, end: int, items: list):
+        if self._item_start == -1:
+            return
+        item_text = self.buffer[self._item_start:end + 1].strip()
+        self._item_start = -1
+        try:
+            items.append(json.loads(item_text))
+        except json.JSONDecodeError:
+            logging.warning(f"StreamingJsonExtractor: Skipping malformed array item: {item_text}")
+
+    def _complete_object(self, end: int):
+        try:
+            self.result = json.loads(self.buffer[self._object_start:end + 1])
+        except json.JSONDecodeError:
+            self._object_start = -1
+            self._array_depth = None
+            self._item_start = -1
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import agents.researcher as researcher
+from agents.researcher import ResearcherAgent, ResearchRun
+from tools.schemas import WebSearchResult
+from usage import estimate_message_tokens, estimate_tokens
+
+ARTICLES = 25
+ARTICLE_WORDS = 1200
+SUMMARY_WORDS = 60
+BASE_LATENCY_SECONDS = 0.3
+SECONDS_PER_1K_TOKENS = 0.02
+ARTICLE_PATTERN = re.compile(r'ARTICLE (\d+): "')
+
+class FakeSummarizer:
+    # Stands in for the summarizer model: latency grows with prompt size, and batches can be answered with 0-based ids.
+    def __init__(self, malformed_batches: bool):
+        self.malformed_batches = malformed_batches
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def chat_completion(self, model_config, messages):
+        prompt_tokens = estimate_message_tokens(messages)
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        await asyncio.sleep(BASE_LATENCY_SECONDS + SECONDS_PER_1K_TOKENS * prompt_tokens / 1000)
+
+        summary = " ".join(f"fact{i}" for i in range(SUMMARY_WORDS))
+        article_ids = [int(article_id) for article_id in ARTICLE_PATTERN.findall(messages[0]["content"])]
+        if article_ids:
+            offset = 1 if self.malformed_batches else 0
+            output = json.dumps({"summaries": [{"id": article_id - offset, "summary": summary, "relevance_score": 8} for article_id in article_ids]})
+        else:
+            output = json.dumps({"summary": summary, "relevance_score": 8})
+        self.completion_tokens += estimate_tokens(output)
+        return output
+
+async def run_scenario(batch_token_budget: int, malformed_batches: bool):
+    fake = FakeSummarizer(malformed_batches)
+    researcher.llm_client.chat_completion = fake.chat_completion
+    researcher.SUMMARY_BATCH_TOKEN_BUDGET = batch_token_budget
+
+    agent = ResearcherAgent()
+    run = ResearchRun(1, "How do heat pumps perform in cold climates?", {}, {"provider": "default"}, None, ARTICLES)
+    article = " ".join(f"word{i % 500}" for i in range(ARTICLE_WORDS))
+    for i in range(ARTICLES):
+        await run.content_queue.put((WebSearchResult(title=f"Article {i}", link=f"https://example.com/{i}", snippet=""), article))
+
+    started_at = time.perf_counter()
+    workers = [asyncio.create_task(agent._summarize_worker(run)) for _ in range(agent.summarize_concurrency)]
+    await agent._close_stage(run.content_queue, workers)
+    return fake, len(run.summaries), time.perf_counter() - started_at
+
+async def main():
+    print(f"{ARTICLES} articles of ~{ARTICLE_WORDS} words, {ResearcherAgent().summarize_concurrency} summarize workers, simulated {BASE_LATENCY_SECONDS}s base latency\n")
+    print(f"{'mode':>22} {'LLM calls':>10} {'prompt tok':>11} {'output tok':>11} {'summaries':>10} {'wall time':>10}")
+    scenarios = [("per-URL", 0, False), ("batched", researcher.SUMMARY_BATCH_TOKEN_BUDGET, False), ("batched, bad ids", researcher.SUMMARY_BATCH_TOKEN_BUDGET, True)]
+    for label, budget, malformed in scenarios:
+        fake, summaries, elapsed = await run_scenario(budget, malformed)
+        print(f"{label:>22} {fake.calls:>10} {fake.prompt_tokens:>11} {fake.completion_tokens:>11} {summaries:>10} {elapsed:>9.2f}s")
+    print("\n'bad ids' answers every batch with 0-based ids, so each batch is discarded and its articles are summarized individually.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
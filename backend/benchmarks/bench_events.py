@@ -0,0 +1,82 @@
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from agents.schemas import PlanStep, SummarizedContent, FinalReport
+from event_encoding import EventEncoder
+
+RUNS = 50
+TASKS = 5
+SUMMARIES_PER_TASK = 5
+SUMMARY_WORDS = 220
+
+def synthetic_run() -> list[dict]:
+    events = []
+    for task_id in range(1, TASKS + 1):
+        events.append({"event": "agent_start", "data": PlanStep(task_id=task_id, agent="ResearcherAgent", prompt=f"Investigate aspect {task_id} of the topic.")})
+        events.append({"event": "queries_generated", "data": {"queries": [f"aspect {task_id} query {i}" for i in range(4)]}})
+        summaries = []
+        for i in range(SUMMARIES_PER_TASK):
+            summary = SummarizedContent(
+                url=f"https://example{task_id}.com/article/{i}",
+                title=f"Article {i} about aspect {task_id}",
+                summary=" ".join(f"finding{j}" for j in range(SUMMARY_WORDS)),
+                relevance_score=7 + i % 4,
+            )
+            summaries.append(summary)
+            events.append({"event": "summary_complete", "data": summary})
+        events.append({"event": "agent_stop", "data": {"task_id": task_id, "summaries": summaries}})
+    events.append({"event": "complete", "data": FinalReport(report="# Report\n" + "Body text. " * 2000, image_urls=[])})
+    return events
+
+def to_jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_jsonable(item) for item in value]
+    return value
+
+def legacy_frames(events: list[dict], run_id: str) -> int:
+    # The previous path: model_dump + json.dumps per event, an f-string frame per send, then UTF-8 encoding by Starlette.
+    total = 0
+    for event_id, event in enumerate(events, start=1):
+        data = json.dumps(to_jsonable(event))
+        total += len(f"id: {run_id}:{event_id}\ndata: {data}\n\n".encode("utf-8"))
+    return total
+
+def encoded_frames(events: list[dict], run_id: str, compact: bool) -> int:
+    encoder = EventEncoder(compact=compact)
+    prefix = run_id.encode()
+    total = 0
+    for event_id, event in enumerate(events, start=1):
+        total += len(b"id: %s:%d\ndata: %s\n\n" % (prefix, event_id, encoder.encode(event)))
+    return total
+
+def measure(label: str, encode_run) -> tuple[float, int]:
+    timings, size = [], 0
+    for _ in range(RUNS):
+        events = synthetic_run()
+        started_at = time.perf_counter()
+        size = encode_run(events)
+        timings.append(time.perf_counter() - started_at)
+    median = statistics.median(timings)
+    print(f"{label:>18} {size / 1024:>9.1f} KiB {1000 * median:>9.2f} ms")
+    return median, size
+
+def main():
+    run_id = "0" * 32
+    print(f"Synthetic run: {TASKS} researcher tasks, {TASKS * SUMMARIES_PER_TASK} summaries, median of {RUNS} runs\n")
+    print(f"{'path':>18} {'bytes/run':>13} {'encode CPU':>12}")
+    legacy_time, legacy_size = measure("json.dumps", lambda events: legacy_frames(events, run_id))
+    for label, compact in (("orjson", False), ("orjson compact", True)):
+        median, size = measure(label, lambda events, compact=compact: encoded_frames(events, run_id, compact))
+        print(f"{'':>18} {100 * (1 - size / legacy_size):>8.1f}% smaller, {legacy_time / median:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
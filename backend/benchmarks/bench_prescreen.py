@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from agents.prescreen import prescreen_results
+from config import PRESCREEN_MIN_SCORE, PRESCREEN_MAX_PER_QUERY
+from tools.schemas import WebSearchResult
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "data", "prescreen_fixture.json")
+# ResearcherAgent asks the search tool for 5 results per query; the 10-result rows show the ranking on a larger pool.
+SHIPPED_RESULTS_PER_QUERY = 5
+SETTINGS = [
+    (10, 0.0, 10), (10, 0.02, 10), (10, 0.05, 10), (10, 0.1, 10), (10, 0.0, 4), (10, 0.02, 4), (10, 0.05, 4),
+    (5, 0.0, 5), (5, 0.05, 5), (5, 0.1, 5), (5, 0.0, 4), (5, 0.02, 4), (SHIPPED_RESULTS_PER_QUERY, PRESCREEN_MIN_SCORE, PRESCREEN_MAX_PER_QUERY),
+]
+
+def main():
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+
+    print(f"{'results':>7} {'min_score':>9} {'limit':>6} {'fetched':>8} {'avoided':>8} {'recall':>7} {'precision':>9} {'ms/query':>9}")
+    for results_per_query, threshold, limit in SETTINGS:
+        fetched = relevant_fetched = relevant_total = total = 0
+        elapsed = 0.0
+        for case in fixture:
+            ranked = case["results"][:results_per_query]
+            results = [WebSearchResult(title=r["title"], link=r["link"], snippet=r["snippet"]) for r in ranked]
+            relevant = {r["link"] for r in ranked if r["relevant"]}
+            started_at = time.perf_counter()
+            accepted, _ = prescreen_results(case["prompt"], results, threshold, limit)
+            elapsed += time.perf_counter() - started_at
+
+            accepted_links = {result.link for result, _ in accepted}
+            total += len(results)
+            fetched += len(accepted_links)
+            relevant_total += len(relevant)
+            relevant_fetched += len(accepted_links & relevant)
+
+        avoided = total - fetched
+        precision = relevant_fetched / fetched if fetched else 0.0
+        recall = relevant_fetched / relevant_total if relevant_total else 1.0
+        shipped = " <- defaults when PRESCREEN_ENABLED" if (results_per_query, threshold, limit) == SETTINGS[-1] else ""
+        print(f"{results_per_query:>7} {threshold:>9.2f} {limit:>6} {fetched:>8} {avoided:>8} {recall:>7.2f} {precision:>9.2f} {1000 * elapsed / len(fixture):>9.2f}{shipped}")
+    print("Each avoided fetch also avoids one summarization LLM call (or one batch slot).")
+
+if __name__ == "__main__":
+    main()
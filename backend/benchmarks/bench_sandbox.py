@@ -0,0 +1,53 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sandbox import SubprocessSandbox
+
+RUNS = 20
+SNIPPETS = [
+    ("arithmetic", "print(4333/687)"),
+    ("loop", "print(sum(i * i for i in range(200000)))"),
+]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def make_backends():
+    backends = [SubprocessSandbox()]
+    try:
+        from sandbox.docker_backend import DockerSandbox
+        backends.insert(0, DockerSandbox())
+    except ImportError:
+        print("docker SDK not installed, skipping the Docker backend.")
+    return backends
+
+async def bench(backend, startup):
+    print(f"\n{backend.name}: startup {1000 * startup:.1f} ms")
+    print(f"{'snippet':>12} {'p50 ms':>8} {'p95 ms':>8} {'output':>20}")
+    for label, code in SNIPPETS:
+        latencies, output = [], ""
+        for _ in range(RUNS):
+            started_at = time.perf_counter()
+            output = await backend.execute(code)
+            latencies.append(time.perf_counter() - started_at)
+            await asyncio.sleep(0.05)
+        print(f"{label:>12} {1000 * statistics.median(latencies):>8.1f} {1000 * percentile(latencies, 0.95):>8.1f} {output.strip()[:20]:>20}")
+    await backend.close()
+
+async def main():
+    for backend in make_backends():
+        started_at = time.perf_counter()
+        await backend.start()
+        if not backend.is_available:
+            print(f"\n{backend.name}: unavailable, skipped.")
+            continue
+        await bench(backend, time.perf_counter() - started_at)
+
+if __name__ == "__main__":
+    asyncio.run(main())
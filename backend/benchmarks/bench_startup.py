@@ -0,0 +1,48 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+sys.path.append(BACKEND_DIR)
+
+RUNS = 5
+DEFERRED_MODULES = ["openai", "anthropic", "google.genai", "docker", "readability", "bs4", "pypdf", "fake_useragent"]
+
+def import_seconds(statement: str) -> float:
+    script = f"import time; started_at = time.perf_counter(); {statement}; print(time.perf_counter() - started_at)"
+    output = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+async def lifespan_seconds():
+    from main import app, lifespan
+    from readiness import readiness
+
+    started_at = time.perf_counter()
+    async with lifespan(app):
+        serving = time.perf_counter() - started_at
+        await readiness.wait()
+        ready = time.perf_counter() - started_at
+        snapshot = readiness.snapshot()
+    return serving, ready, snapshot
+
+def main():
+    samples = [import_seconds("import main") for _ in range(RUNS)]
+    print(f"import main: median {1000 * statistics.median(samples):.0f} ms, max {1000 * max(samples):.0f} ms over {RUNS} runs")
+
+    print("\nDeferred until first use:")
+    for module in DEFERRED_MODULES:
+        try:
+            print(f"{module:>16} {1000 * import_seconds(f'import {module}'):>8.0f} ms")
+        except subprocess.CalledProcessError:
+            print(f"{module:>16} {'missing':>11}")
+
+    serving, ready, snapshot = asyncio.run(lifespan_seconds())
+    print(f"\nlifespan: accepting requests after {1000 * serving:.1f} ms, all subsystems settled after {1000 * ready:.0f} ms")
+    for name, entry in snapshot["subsystems"].items():
+        print(f"{name:>16} {entry['status']:>8} {entry.get('startup_seconds', 0) * 1000:>8.0f} ms  {entry.get('detail') or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Tuple
+
+class CascadeStats:
+    def __init__(self):
+        self._tiers: Dict[str, Dict[str, float]] = {}
+
+    def _tier(self, tier: str) -> Dict[str, float]:
+        return self._tiers.setdefault(tier, {"calls": 0, "failures": 0, "escalations": 0, "total_latency": 0.0})
+
+    @asynccontextmanager
+    async def track(self, tier: str):
+        stats = self._tier(tier)
+        started_at = time.monotonic()
+        stats["calls"] += 1
+        try:
+            yield
+        except Exception:
+            stats["failures"] += 1
+            raise
+        finally:
+            stats["total_latency"] += time.monotonic() - started_at
+
+    def record_escalation(self, tier: str, count: int = 1):
+        self._tier(tier)["escalations"] += count
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            tier: {**stats, "avg_latency": stats["total_latency"] / stats["calls"] if stats["calls"] else None}
+            for tier, stats in self._tiers.items()
+        }
+
+cascade_stats = CascadeStats()
+
+def cascade_tiers(model_config: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    strong_config = {key: value for key, value in model_config.items() if key != "cascade"}
+    cheap_config = model_config.get("cascade")
+    if not cheap_config:
+        return [("strong", strong_config)]
+    return [("cheap", {**cheap_config, "role": model_config.get("role")}), ("strong", strong_config)]
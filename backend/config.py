@@ -1,18 +1,91 @@
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 DEFAULT_MODEL_MAPPING = {
     "prism-reasoning-core": {
         "provider": "pollinations",
-        "model": "openai-reasoning"
+        "model": "openai-reasoning",
+        "fallbacks": [{"provider": "pollinations", "model": "openai"}]
     },
     "prism-researcher-default": {
         "provider": "pollinations",
-        "model": "openai-fast"
+        "model": "openai-fast",
+        "fallbacks": [{"provider": "pollinations", "model": "openai"}]
     },
     "prism-summarizer-large-context": {
         "provider": "pollinations",
-        "model": "gemini"
+        "model": "gemini",
+        "fallbacks": [{"provider": "pollinations", "model": "openai"}],
+        "cascade": {"provider": "pollinations", "model": "openai-fast"}
     },
     "prism-coder-agent": {
         "provider": "pollinations",
-        "model": "qwen-coder"
+        "model": "qwen-coder",
+        "fallbacks": [{"provider": "pollinations", "model": "openai"}]
     }
-}
\ No newline at end of file
+}
+
+CACHE_DIR = os.getenv("PRISM_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".prism_cache"))
+
+SUMMARY_INDEX_ENABLED = os.getenv("SUMMARY_INDEX_ENABLED", "true").lower() == "true"
+SUMMARY_INDEX_DIR = os.path.join(CACHE_DIR, "summary_index")
+SUMMARY_INDEX_TTL_HOURS = float(os.getenv("SUMMARY_INDEX_TTL_HOURS", "72"))
+SUMMARY_INDEX_SIMILARITY_THRESHOLD = float(os.getenv("SUMMARY_INDEX_SIMILARITY_THRESHOLD", "0.75"))
+SUMMARY_INDEX_MIN_RELEVANCE = int(os.getenv("SUMMARY_INDEX_MIN_RELEVANCE", "7"))
+SUMMARY_INDEX_MAX_RESULTS = int(os.getenv("SUMMARY_INDEX_MAX_RESULTS", "10"))
+SUMMARY_INDEX_MIN_HITS_TO_SKIP_SEARCH = int(os.getenv("SUMMARY_INDEX_MIN_HITS_TO_SKIP_SEARCH", "6"))
+
+# Planner rewrites of the query typically score 0.15-0.3 on the hashed embedding, so by default any first research step adopts the
+# prefetch, and the step's prompt is replaced with the user query it actually researched.
+SPECULATION_PROMPT_MATCH_THRESHOLD = float(os.getenv("SPECULATION_PROMPT_MATCH_THRESHOLD", "0.0"))
+
+SUMMARY_BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "24000"))
+SUMMARY_BATCH_MAX_DOCUMENTS = int(os.getenv("SUMMARY_BATCH_MAX_DOCUMENTS", "6"))
+SUMMARY_BATCH_LINGER_SECONDS = float(os.getenv("SUMMARY_BATCH_LINGER_SECONDS", "0.5"))
+
+CASCADE_ESCALATION_THRESHOLD = int(os.getenv("CASCADE_ESCALATION_THRESHOLD", "5"))
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "false").lower() == "true"
+PRESCREEN_MIN_SCORE = float(os.getenv("PRESCREEN_MIN_SCORE", "0.02"))
+PRESCREEN_MAX_PER_QUERY = int(os.getenv("PRESCREEN_MAX_PER_QUERY", "5"))
+PRESCREEN_MAX_FETCHES = int(os.getenv("PRESCREEN_MAX_FETCHES", "15"))
+
+SANDBOX_BACKEND = os.getenv("SANDBOX_BACKEND", "auto")
+
+POLLINATIONS_MAX_IN_FLIGHT = int(os.getenv("POLLINATIONS_MAX_IN_FLIGHT", "8"))
+
+FETCH_STATS_PATH = os.path.join(CACHE_DIR, "fetch_hosts.json")
+FETCH_PER_HOST_CONCURRENCY = int(os.getenv("FETCH_PER_HOST_CONCURRENCY", "2"))
+FETCH_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("FETCH_DEFAULT_TIMEOUT_SECONDS", "10"))
+FETCH_MIN_TIMEOUT_SECONDS = float(os.getenv("FETCH_MIN_TIMEOUT_SECONDS", "4"))
+FETCH_LATENCY_BUDGET_MULTIPLIER = float(os.getenv("FETCH_LATENCY_BUDGET_MULTIPLIER", "3"))
+FETCH_PENALTY_SECONDS = float(os.getenv("FETCH_PENALTY_SECONDS", "900"))
+
+# USD per million (input, output) tokens. Keys are "provider:model" or a model name prefix.
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "o3-mini": (1.10, 4.40),
+    "o4-mini": (1.10, 4.40),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-opus-4": (15.00, 75.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+MODEL_PRICING.update(json.loads(os.getenv("MODEL_PRICING_JSON", "{}")))
+USAGE_BUDGET_SOFT_LIMIT = float(os.getenv("USAGE_BUDGET_SOFT_LIMIT", "0.8"))
+STREAM_USAGE_DRAIN_SECONDS = float(os.getenv("STREAM_USAGE_DRAIN_SECONDS", "30"))
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", "10"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
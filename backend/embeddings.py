@@ -0,0 +1,36 @@
+import re
+import zlib
+import numpy as np
+
+EMBEDDING_DIM = 1024
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("a an and are as at be by for from has have how in is it its of on or that the this to was were what when where which who why will with".split())
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+def _weighted_features(tokens: list[str]) -> list[tuple[str, float]]:
+    features = [(token, 1.0) for token in tokens]
+    features += [(f"{left} {right}", 0.5) for left, right in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"<{token}>"
+        features += [(f"#{padded[i:i + 4]}", 0.25) for i in range(max(1, len(padded) - 3))]
+    return features
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    features = _weighted_features(tokenize(text))
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+
+    hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature, _ in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter((weight for _, weight in features), dtype=np.float32, count=len(features))
+    weights *= np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dim, weights)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norm) if norm else 0.0
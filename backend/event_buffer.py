@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from event_encoding import EventEncoder
+
+RUN_BUFFER_MAX_EVENTS = 2000
+COMPLETED_RUNS_MAX_BYTES = 32 * 1024 * 1024
+COMPLETED_RUN_TTL_SECONDS = 15 * 60
+KEEPALIVE_INTERVAL_SECONDS = 15
+# Long enough to cover the frontend's reconnect backoff, so only a client that has really gone away loses its run.
+DETACHED_RUN_GRACE_SECONDS = 3 * KEEPALIVE_INTERVAL_SECONDS
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+END_FRAME = b"event: end\n\n"
+
+class RunEventBuffer:
+    def __init__(self, run_id: str, max_events: int = RUN_BUFFER_MAX_EVENTS):
+        self.run_id = run_id
+        self.events: Deque[Tuple[int, bytes]] = deque(maxlen=max_events)
+        self.next_event_id = 1
+        self.size_bytes = 0
+        self.completed_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.detached_since: Optional[float] = time.monotonic()
+        self._condition = asyncio.Condition()
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completed_at is not None
+
+    async def append(self, data: bytes):
+        async with self._condition:
+            if len(self.events) == self.events.maxlen:
+                self.size_bytes -= len(self.events[0][1])
+            frame = b"id: %s:%d\ndata: %s\n\n" % (self.run_id.encode(), self.next_event_id, data)
+            self.events.append((self.next_event_id, frame))
+            self.size_bytes += len(frame)
+            self.next_event_id += 1
+            self._condition.notify_all()
+
+    async def close(self):
+        async with self._condition:
+            self.completed_at = time.monotonic()
+            self._condition.notify_all()
+
+    def _events_after(self, cursor: int) -> list[Tuple[int, bytes]]:
+        if not self.events:
+            return []
+        first_id = self.events[0][0]
+        if cursor + 1 < first_id:
+            logging.warning(f"Run {self.run_id}: events {cursor + 1}-{first_id - 1} were evicted from the replay buffer.")
+        return list(itertools.islice(self.events, max(0, cursor + 1 - first_id), None))
+
+    def cancel(self, reason: str) -> bool:
+        if self.is_complete or self.task is None or self.task.done():
+            return False
+        logging.info(f"Run {self.run_id}: cancelling, {reason}.")
+        self.task.cancel()
+        return True
+
+    async def sse_frames(self, last_event_id: int = 0) -> AsyncIterator[bytes]:
+        self.subscribers += 1
+        self.detached_since = None
+        try:
+            async for frame in self._frames_after(last_event_id):
+                yield frame
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self.detached_since = time.monotonic()
+
+    async def _frames_after(self, last_event_id: int) -> AsyncIterator[bytes]:
+        cursor = last_event_id
+        while True:
+            async with self._condition:
+                pending = self._events_after(cursor)
+                if not pending and not self.is_complete:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), KEEPALIVE_INTERVAL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    pending = self._events_after(cursor)
+                finished = self.is_complete
+
+            if not pending and not finished:
+                yield KEEPALIVE_FRAME
+            for event_id, frame in pending:
+                cursor = event_id
+                yield frame
+            if finished:
+                yield END_FRAME
+                return
+
+class RunRegistry:
+    def __init__(self):
+        self._runs: Dict[str, RunEventBuffer] = {}
+
+    def start(self, event_source: AsyncIterator[Dict[str, Any]], encoder: Optional[EventEncoder] = None) -> RunEventBuffer:
+        self._evict()
+        run = RunEventBuffer(uuid.uuid4().hex)
+        self._runs[run.run_id] = run
+        run.task = asyncio.create_task(self._pump(run, event_source, encoder or EventEncoder()))
+        run.watchdog = asyncio.create_task(self._cancel_when_detached(run))
+        logging.info(f"Started research run {run.run_id}.")
+        return run
+
+    def get(self, run_id: str) -> Optional[RunEventBuffer]:
+        return self._runs.get(run_id)
+
+    def resolve(self, last_event_id: str) -> Tuple[Optional[RunEventBuffer], int]:
+        run_id, _, event_id = last_event_id.strip().partition(":")
+        run = self.get(run_id)
+        if run is None or not event_id.isdigit():
+            return None, 0
+        return run, int(event_id)
+
+    async def _pump(self, run: RunEventBuffer, event_source: AsyncIterator[Dict[str, Any]], encoder: EventEncoder):
+        try:
+            async for event in event_source:
+                await run.append(encoder.encode(event))
+        except asyncio.CancelledError:
+            await run.append(encoder.encode({"event": "error", "data": {"detail": "Research run was cancelled."}}))
+            raise
+        except Exception as e:
+            logging.error(f"Run {run.run_id}: event source failed: {e}", exc_info=True)
+        finally:
+            await run.close()
+            stats = encoder.stats
+            logging.info(f"Run {run.run_id}: encoded {stats['events']} events into {stats['bytes']} bytes in {1000 * stats['encode_seconds']:.1f}ms ({stats['cache_hits']} cached summaries, {stats['summary_refs']} summary refs).")
+            self._evict()
+
+    async def _cancel_when_detached(self, run: RunEventBuffer):
+        # Nothing else stops a run whose client has left, and each step spends search and LLM quota.
+        while not run.is_complete:
+            await asyncio.sleep(KEEPALIVE_INTERVAL_SECONDS)
+            if run.subscribers == 0 and run.detached_since is not None and time.monotonic() - run.detached_since >= DETACHED_RUN_GRACE_SECONDS:
+                run.cancel(f"no client attached for {DETACHED_RUN_GRACE_SECONDS}s")
+                return
+
+    def _evict(self):
+        now = time.monotonic()
+        completed = sorted((run for run in self._runs.values() if run.is_complete), key=lambda run: run.completed_at)
+        for run in [run for run in completed if now - run.completed_at > COMPLETED_RUN_TTL_SECONDS]:
+            del self._runs[run.run_id]
+            completed.remove(run)
+
+        total_bytes = sum(run.size_bytes for run in completed)
+        while completed and total_bytes > COMPLETED_RUNS_MAX_BYTES:
+            run = completed.pop(0)
+            total_bytes -= run.size_bytes
+            del self._runs[run.run_id]
+            logging.info(f"Evicted replay buffer for run {run.run_id} to stay under the memory cap.")
+
+run_registry = RunRegistry()
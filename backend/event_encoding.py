@@ -0,0 +1,54 @@
+import time
+from typing import Any, Dict, Tuple
+
+import orjson
+from pydantic import BaseModel
+
+from agents.schemas import SummarizedContent
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+class EventEncoder:
+    # Summaries are never mutated once emitted, so their encoding is cached by identity for the whole run.
+    # In compact mode a summary is sent as {"ref": url} only when it is the very object most recently sent in full
+    # for that URL, which is exactly what a client keeping the last full summary per URL will resolve it to.
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        self._summary_fragments: Dict[int, Tuple[SummarizedContent, orjson.Fragment]] = {}
+        self._last_sent_by_url: Dict[str, SummarizedContent] = {}
+        self.stats = {"events": 0, "bytes": 0, "encode_seconds": 0.0, "cache_hits": 0, "summary_refs": 0}
+
+    def _full_summary(self, summary: SummarizedContent) -> orjson.Fragment:
+        cached = self._summary_fragments.get(id(summary))
+        if cached is not None and cached[0] is summary:
+            self.stats["cache_hits"] += 1
+            fragment = cached[1]
+        else:
+            fragment = orjson.Fragment(summary.model_dump_json())
+            self._summary_fragments[id(summary)] = (summary, fragment)
+        self._last_sent_by_url[summary.url] = summary
+        return fragment
+
+    def _encode_summary(self, summary: SummarizedContent) -> Any:
+        if self.compact and self._last_sent_by_url.get(summary.url) is summary:
+            self.stats["summary_refs"] += 1
+            return {"ref": summary.url}
+        return self._full_summary(summary)
+
+    def _default(self, obj: Any) -> Any:
+        if isinstance(obj, SummarizedContent):
+            return self._encode_summary(obj)
+        if isinstance(obj, BaseModel):
+            return orjson.Fragment(obj.model_dump_json())
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        started_at = time.perf_counter()
+        if isinstance(event.get("data"), SummarizedContent):
+            # summary_complete carries the summary itself and is what refs point back to, so it is always sent in full.
+            event = {**event, "data": self._full_summary(event["data"])}
+        data = orjson.dumps(event, default=self._default, option=ORJSON_OPTIONS)
+        self.stats["encode_seconds"] += time.perf_counter() - started_at
+        self.stats["events"] += 1
+        self.stats["bytes"] += len(data)
+        return data
@@ -1,19 +1,30 @@
 import logging
 import asyncio
-from typing import Dict, Any
-
-import httpx
-import openai
-import anthropic
-import google.genai as genai
+import time
+from typing import Dict, Any, AsyncGenerator, List, Optional, Tuple
 
 from exceptions import RateLimitException, ServiceUnavailableException, ExternalApiException
+from provider_health import provider_health
+from pollinations_client import pollinations_client
+from usage import record_usage
+from config import STREAM_USAGE_DRAIN_SECONDS
+
+class StreamAttempt:
+    def __init__(self, config: Dict[str, Any], messages: list[dict]):
+        self.config = config
+        self.messages = messages
+        self.started_at = time.monotonic()
+        self.usage: Dict[str, int] = {}
+        self.completion: List[str] = []
+        self.stream: Optional[AsyncGenerator[str, None]] = None
 
 class LLMClient:
     def __init__(self):
         self.max_retries = 3
+        self._drains: set[asyncio.Task] = set()
 
-    async def _call_openai_compatible(self, model_config: Dict[str, Any], messages: list[dict]) -> str:
+    async def _call_openai_compatible(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> str:
+        import openai
         provider = model_config.get("provider")
         api_key = model_config.get("apiKey")
         model_name = model_config.get("model")
@@ -28,6 +39,8 @@ class LLMClient:
         client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
         try:
             response = await client.chat.completions.create(model=model_name, messages=messages, timeout=120)
+            if response.usage:
+                usage.update(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
             content = response.choices[0].message.content
             if not content:
                 raise Exception("LLM response was empty or malformed.")
@@ -41,13 +54,43 @@ class LLMClient:
         except openai.APIError as e:
             raise ExternalApiException(f"The '{provider}' API returned an unexpected error: {e}")
 
-    async def _call_anthropic(self, model_config: Dict[str, Any], messages: list[dict]) -> str:
+    async def _stream_openai_compatible(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> AsyncGenerator[str, None]:
+        import openai
+        provider = model_config.get("provider")
+        base_url = model_config.get("baseUrl")
+        if not base_url:
+            if provider == "openrouter":
+                base_url = "https://openrouter.ai/api/v1"
+            elif provider == "openai":
+                base_url = "https://api.openai.com/v1"
+
+        client = openai.AsyncOpenAI(api_key=model_config.get("apiKey"), base_url=base_url)
+        try:
+            stream_options = {"stream_options": {"include_usage": True}} if provider in ["openai", "openrouter"] else {}
+            stream = await client.chat.completions.create(model=model_config.get("model"), messages=messages, stream=True, timeout=120, **stream_options)
+            async for chunk in stream:
+                if chunk.usage:
+                    usage.update(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.RateLimitError as e:
+            raise RateLimitException(f"The '{provider}' API rate limit was exceeded. Please check your plan and quota.")
+        except openai.APIStatusError as e:
+            if e.status_code >= 500:
+                raise ServiceUnavailableException(f"The '{provider}' API is currently unavailable (Status: {e.status_code}). Please try again later.")
+            raise ExternalApiException(f"The '{provider}' API returned an unexpected error: {e.status_code}")
+        except openai.APIError as e:
+            raise ExternalApiException(f"The '{provider}' API returned an unexpected error: {e}")
+
+    async def _call_anthropic(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> str:
+        import anthropic
         api_key = model_config.get("apiKey")
         model_name = model_config.get("model")
 
         client = anthropic.AsyncAnthropic(api_key=api_key)
         try:
             response = await client.messages.create(model=model_name, messages=messages, max_tokens=4096, timeout=120)
+            usage.update(prompt_tokens=response.usage.input_tokens, completion_tokens=response.usage.output_tokens)
             content = response.content[0].text
             if not content:
                 raise Exception("LLM response was empty or malformed.")
@@ -61,7 +104,27 @@ class LLMClient:
         except anthropic.APIError as e:
             raise ExternalApiException(f"The 'anthropic' API returned an unexpected error: {e}")
 
-    async def _call_google(self, model_config: Dict[str, Any], messages: list[dict]) -> str:
+    async def _stream_anthropic(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> AsyncGenerator[str, None]:
+        import anthropic
+        client = anthropic.AsyncAnthropic(api_key=model_config.get("apiKey"))
+        try:
+            async with client.messages.stream(model=model_config.get("model"), messages=messages, max_tokens=4096, timeout=120) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+                final_message = await stream.get_final_message()
+                usage.update(prompt_tokens=final_message.usage.input_tokens, completion_tokens=final_message.usage.output_tokens)
+        except anthropic.RateLimitError as e:
+            raise RateLimitException("The 'anthropic' API rate limit was exceeded. Please check your plan and quota.")
+        except anthropic.APIStatusError as e:
+            if e.status_code >= 500:
+                raise ServiceUnavailableException(f"The 'anthropic' API is currently unavailable (Status: {e.status_code}). Please try again later.")
+            raise ExternalApiException(f"The 'anthropic' API returned an unexpected error: {e.status_code}")
+        except anthropic.APIError as e:
+            raise ExternalApiException(f"The 'anthropic' API returned an unexpected error: {e}")
+
+    async def _call_google(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> str:
+        from google import genai
         api_key = model_config.get("apiKey")
         model_name = model_config.get("model")
 
@@ -78,6 +141,9 @@ class LLMClient:
                 contents=gemini_messages
             )
             
+            metadata = response.usage_metadata
+            if metadata and metadata.prompt_token_count is not None:
+                usage.update(prompt_tokens=metadata.prompt_token_count, completion_tokens=metadata.candidates_token_count or 0)
             content = response.text
             if not content:
                 raise Exception("LLM response was empty or malformed.")
@@ -94,18 +160,38 @@ class LLMClient:
             else:
                  raise ExternalApiException(f"The 'google' API returned an unexpected error: {e}")
 
-    async def chat_completion(self, model_config: Dict[str, Any], messages: list[dict]) -> str:
+    async def _stream_google(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> AsyncGenerator[str, None]:
+        from google import genai
+        client = genai.Client(api_key=model_config.get("apiKey"))
+        gemini_messages = [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+            for m in messages
+        ]
+        try:
+            async for chunk in await client.aio.models.generate_content_stream(model=model_config.get("model"), contents=gemini_messages):
+                metadata = chunk.usage_metadata
+                if metadata and metadata.prompt_token_count is not None:
+                    usage.update(prompt_tokens=metadata.prompt_token_count, completion_tokens=metadata.candidates_token_count or 0)
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            error_str = str(e).lower()
+            if "resource has been exhausted" in error_str or "rate limit" in error_str:
+                 raise RateLimitException(f"The 'google' API rate limit was exceeded. Please check your plan and quota. Details: {e}")
+            elif "service unavailable" in error_str:
+                 raise ServiceUnavailableException(f"The 'google' API is currently unavailable. Please try again later. Details: {e}")
+            else:
+                 raise ExternalApiException(f"The 'google' API returned an unexpected error: {e}")
+
+    async def _stream_pollinations(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> AsyncGenerator[str, None]:
+        async for delta in pollinations_client.chat_completion_stream(model_config.get("model"), messages, usage):
+            yield delta
+
+    async def _complete_with_provider(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> str:
         provider = model_config.get("provider", "default")
 
         if provider in ["default", "pollinations"]:
-            model_name = model_config.get("model")
-            async with httpx.AsyncClient(timeout=120) as client:
-                response = await client.post(
-                    "http://localhost:8000/v1/internal/pollinations", 
-                    json={"model": model_name, "messages": messages}
-                )
-                response.raise_for_status()
-                return response.json()
+            return await pollinations_client.chat_completion(model_config.get("model"), messages, usage)
 
         if not model_config.get("apiKey") or not model_config.get("model"):
             raise ValueError(f"Missing api_key or model for '{provider}' provider.")
@@ -125,7 +211,7 @@ class LLMClient:
         last_exception = None
         for attempt in range(self.max_retries):
             try:
-                return await call_func(model_config, messages)
+                return await call_func(model_config, messages, usage)
             except (RateLimitException, ServiceUnavailableException, ExternalApiException) as e:
                 logging.error(f"LLM call to {provider} failed with a definitive API error: {e}")
                 raise e
@@ -140,4 +226,194 @@ class LLMClient:
         
         raise last_exception if last_exception else Exception("LLM call failed after all retries.")
 
+    async def _stream_with_provider(self, model_config: Dict[str, Any], messages: list[dict], usage: Dict[str, int]) -> AsyncGenerator[str, None]:
+        provider = model_config.get("provider", "default")
+
+        if provider not in ["default", "pollinations"] and (not model_config.get("apiKey") or not model_config.get("model")):
+            raise ValueError(f"Missing api_key or model for '{provider}' provider.")
+
+        provider_map = {
+            "default": self._stream_pollinations,
+            "pollinations": self._stream_pollinations,
+            "openai": self._stream_openai_compatible,
+            "openrouter": self._stream_openai_compatible,
+            "openai_compatible": self._stream_openai_compatible,
+            "anthropic": self._stream_anthropic,
+            "google": self._stream_google,
+        }
+
+        stream_func = provider_map.get(provider)
+        if not stream_func:
+            raise ValueError(f"Unsupported provider: '{provider}'.")
+
+        for attempt in range(self.max_retries):
+            received_output = False
+            try:
+                async for delta in stream_func(model_config, messages, usage):
+                    received_output = True
+                    yield delta
+                if not received_output:
+                    raise Exception("LLM response was empty or malformed.")
+                return
+            except (RateLimitException, ServiceUnavailableException, ExternalApiException) as e:
+                logging.error(f"LLM stream from {provider} failed with a definitive API error: {e}")
+                raise e
+            except Exception as e:
+                if received_output or attempt == self.max_retries - 1:
+                    logging.error(f"Error in LLMClient stream for {provider}: {e}", exc_info=True)
+                    raise
+                logging.warning(f"LLMClient stream attempt {attempt + 1}/{self.max_retries} for {provider} failed: {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    def _fallback_chain(self, model_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        chain = [model_config] + [fallback for fallback in model_config.get("fallbacks") or [] if fallback]
+        return provider_health.order(chain)
+
+    def _record_failure(self, model_config: Dict[str, Any], error: Exception):
+        provider_health.stats(model_config).record_failure(rate_limited=isinstance(error, RateLimitException))
+
+    async def _timed_completion(self, model_config: Dict[str, Any], messages: list[dict], role: Optional[str]) -> str:
+        started_at = time.monotonic()
+        usage: Dict[str, int] = {}
+        try:
+            content = await self._complete_with_provider(model_config, messages, usage)
+        except asyncio.CancelledError:
+            # A hedged request that lost the race was still sent, and paid providers bill its prompt.
+            record_usage(role, model_config, messages, "", usage)
+            raise
+        except Exception as e:
+            self._record_failure(model_config, e)
+            raise
+        provider_health.stats(model_config).record_success(time.monotonic() - started_at)
+        record_usage(role, model_config, messages, content, usage)
+        return content
+
+    async def chat_completion(self, model_config: Dict[str, Any], messages: list[dict]) -> str:
+        chain = self._fallback_chain(model_config)
+        pending: Dict[asyncio.Task, Dict[str, Any]] = {}
+        next_index = 0
+        last_exception = None
+
+        def launch_next():
+            nonlocal next_index
+            config = chain[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self._timed_completion(config, messages, model_config.get("role")))] = config
+
+        launch_next()
+        try:
+            while pending:
+                hedge_delay = provider_health.hedge_delay(chain[next_index - 1]) if next_index < len(chain) else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.warning(f"LLMClient: '{provider_health.key(chain[next_index - 1])}' exceeded its {hedge_delay:.1f}s hedge delay; sending a backup request to '{provider_health.key(chain[next_index])}'.")
+                    launch_next()
+                    continue
+                for task in done:
+                    config = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        last_exception = e
+                        logging.warning(f"LLMClient: '{provider_health.key(config)}' failed: {e}")
+                if next_index < len(chain):
+                    logging.info(f"LLMClient: Failing over to '{provider_health.key(chain[next_index])}'.")
+                    launch_next()
+            raise last_exception
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _start_stream(self, config: Dict[str, Any], messages: list[dict]) -> Tuple[asyncio.Task, StreamAttempt]:
+        attempt = StreamAttempt(config, messages)
+        attempt.stream = self._stream_with_provider(config, messages, attempt.usage)
+        return asyncio.ensure_future(attempt.stream.__anext__()), attempt
+
+    async def _first_delta(self, model_config: Dict[str, Any], messages: list[dict]) -> Tuple[StreamAttempt, str]:
+        # Streams are hedged on time to first token: a backup stream starts once the current one has been silent for its p95 latency.
+        chain = self._fallback_chain(model_config)
+        pending: Dict[asyncio.Task, StreamAttempt] = {}
+        next_index = 0
+        last_exception = None
+
+        def launch_next():
+            nonlocal next_index
+            task, attempt = self._start_stream(chain[next_index], messages)
+            next_index += 1
+            pending[task] = attempt
+
+        launch_next()
+        try:
+            while pending:
+                hedge_delay = provider_health.hedge_delay(chain[next_index - 1]) if next_index < len(chain) else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.warning(f"LLMClient: '{provider_health.key(chain[next_index - 1])}' produced no output within its {hedge_delay:.1f}s hedge delay; starting a backup stream from '{provider_health.key(chain[next_index])}'.")
+                    launch_next()
+                    continue
+                for task in done:
+                    attempt = pending.pop(task)
+                    try:
+                        return attempt, task.result()
+                    except StopAsyncIteration:
+                        last_exception = Exception("LLM response was empty or malformed.")
+                    except Exception as e:
+                        last_exception = e
+                    self._record_failure(attempt.config, last_exception)
+                    logging.warning(f"LLMClient: Stream from '{provider_health.key(attempt.config)}' failed before producing output: {last_exception}")
+                if not pending and next_index < len(chain):
+                    logging.info(f"LLMClient: Failing over to '{provider_health.key(chain[next_index])}'.")
+                    launch_next()
+            raise last_exception
+        finally:
+            for task, attempt in pending.items():
+                task.cancel()
+                result = (await asyncio.gather(task, return_exceptions=True))[0]
+                await attempt.stream.aclose()
+                if isinstance(result, str):
+                    attempt.completion.append(result)
+                # The losing stream was still sent, and paid providers bill its prompt.
+                record_usage(model_config.get("role"), attempt.config, messages, "".join(attempt.completion), attempt.usage)
+
+    async def _drain_for_usage(self, attempt: StreamAttempt, role: Optional[str]):
+        # Providers report usage in the final chunk, after the text a structured-output consumer stops reading at.
+        async def drain():
+            async for delta in attempt.stream:
+                attempt.completion.append(delta)
+
+        try:
+            await asyncio.wait_for(drain(), STREAM_USAGE_DRAIN_SECONDS)
+        except Exception as e:
+            logging.info(f"LLMClient: Stopped draining '{provider_health.key(attempt.config)}' for usage after the consumer closed the stream: {e!r}")
+        finally:
+            await attempt.stream.aclose()
+            record_usage(role, attempt.config, attempt.messages, "".join(attempt.completion), attempt.usage)
+
+    async def chat_completion_stream(self, model_config: Dict[str, Any], messages: list[dict]) -> AsyncGenerator[str, None]:
+        attempt, first_delta = await self._first_delta(model_config, messages)
+        closed_early = False
+        try:
+            attempt.completion.append(first_delta)
+            yield first_delta
+            async for delta in attempt.stream:
+                attempt.completion.append(delta)
+                yield delta
+            provider_health.stats(attempt.config).record_success(time.monotonic() - attempt.started_at)
+        except GeneratorExit:
+            # The consumer had what it needed, so the provider did its job even though the stream was not read to the end.
+            closed_early = True
+            provider_health.stats(attempt.config).record_success(time.monotonic() - attempt.started_at)
+            raise
+        except Exception as e:
+            self._record_failure(attempt.config, e)
+            raise
+        finally:
+            if closed_early:
+                drain = asyncio.create_task(self._drain_for_usage(attempt, model_config.get("role")))
+                self._drains.add(drain)
+                drain.add_done_callback(self._drains.discard)
+            else:
+                await attempt.stream.aclose()
+                record_usage(model_config.get("role"), attempt.config, messages, "".join(attempt.completion), attempt.usage)
+
 llm_client = LLMClient()
\ No newline at end of file
@@ -1,10 +1,11 @@
 import asyncio
-import json
-from fastapi import FastAPI, HTTPException, Body, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Body, Request, Header, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Optional, Literal
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Literal, Awaitable
 import logging
+import secrets
 import sys
 import os
 from pydantic import BaseModel
@@ -12,8 +13,9 @@ from pydantic import BaseModel
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 
 from models import ModelInfo
-from config import DEFAULT_MODEL_MAPPING
+from config import DEFAULT_MODEL_MAPPING, SPECULATION_PROMPT_MATCH_THRESHOLD, SUMMARY_INDEX_ENABLED, ADMIN_TOKEN, PROFILER_MAX_SECONDS
 from tools import search, web_reader, schemas as tool_schemas
+from tools.fetch_scheduler import fetch_scheduler
 from exceptions import ExternalApiException, RateLimitException, ServiceUnavailableException
 from agents.schemas import FinalReport, CodeExecutorOutput, PlanStep, ResearcherOutput
 from agents.orchestrator import ChiefOrchestrator
@@ -23,22 +25,44 @@ from agents.researcher import ResearcherAgent
 from pollinations_client import pollinations_client
 from llm_client import llm_client
 from search_counter import get_search_count
+from event_buffer import run_registry
+from summary_index import summary_index
+from provider_health import provider_health
+from cascade import cascade_stats
+from speculation import SpeculativeCall, SpeculativeStream
+from embeddings import embed_text, cosine_similarity
+from readiness import readiness
+from usage import UsageTracker, current_usage
+from event_encoding import EventEncoder
+from profiler import profile_lock, profile_window, profile_until
+
+orchestrator = ChiefOrchestrator()
+researcher_agent = ResearcherAgent()
+code_executor = CodeExecutor()
+lead_synthesizer = LeadSynthesizer()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.track("sandbox", code_executor.start(), optional=True)
+    if SUMMARY_INDEX_ENABLED:
+        readiness.track("summary_index", asyncio.to_thread(summary_index.load), optional=True)
+    yield
+    await readiness.cancel()
+    await code_executor.close()
+    await pollinations_client.close()
+    fetch_scheduler.save()
 
 app = FastAPI(
     title="PRISM Backend API",
     description="does stuff",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
-orchestrator = ChiefOrchestrator()
-researcher_agent = ResearcherAgent()
-code_executor = CodeExecutor()
-lead_synthesizer = LeadSynthesizer()
-
 AVAILABLE_TOOLS = {
     "web_search": {"function": search.web_search, "input_schema": tool_schemas.WebSearchInput},
     "read_website": {"function": web_reader.read_website, "input_schema": tool_schemas.WebReaderInput},
@@ -54,16 +78,47 @@ class ModelConfig(BaseModel):
     model: Optional[str] = None
     apiKey: Optional[str] = None
     baseUrl: Optional[str] = None
+    fallbacks: Optional[List["ModelConfig"]] = None
+    cascade: Optional["ModelConfig"] = None
+
+class RunBudget(BaseModel):
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
 
 class ResearchRequest(BaseModel):
     query: str
     model_configs: Dict[str, ModelConfig]
     clarification_mode: Literal["agent", "always_ask", "never_ask"] = "agent"
     research_history: Optional[List[Dict[str, Any]]] = None
+    speculative_execution: bool = False
+    budget: Optional[RunBudget] = None
+    compact_events: bool = False
+
+AGENT_ROLES = {
+    "prism-reasoning-core": "orchestrator",
+    "prism-researcher-default": "researcher",
+    "prism-summarizer-large-context": "summarizer",
+    "prism-coder-agent": "coder",
+}
 
-async def research_event_stream(user_query: str, model_configs: Dict[str, ModelConfig], clarification_mode: str, research_history: Optional[List[Dict[str, Any]]] = None):
+def _discard_speculations(*speculations: Optional[SpeculativeCall]) -> List[Dict[str, Any]]:
+    return [speculation.discard() for speculation in speculations if speculation is not None]
+
+async def _fetch_image_urls(image_search: Awaitable[List[Any]]) -> List[str]:
+    try:
+        return [res.link for res in await image_search]
+    except Exception as e:
+        logging.warning(f"Image search for the final report failed: {e}")
+        return []
+
+def _usage_event(usage_tracker: UsageTracker) -> Dict[str, Any]:
+    return {"event": "usage", "data": usage_tracker.snapshot()}
+
+async def research_event_stream(user_query: str, model_configs: Dict[str, ModelConfig], clarification_mode: str, research_history: Optional[List[Dict[str, Any]]] = None, speculative_execution: bool = False, budget: Optional[RunBudget] = None):
     current_research_history = research_history if research_history is not None else []
     max_steps = 10
+    usage_tracker = UsageTracker(budget.max_tokens, budget.max_cost_usd) if budget else UsageTracker()
+    current_usage.set(usage_tracker)
 
     final_configs = {}
     for agent_name, defaults in DEFAULT_MODEL_MAPPING.items():
@@ -72,23 +127,56 @@ async def research_event_stream(user_query: str, model_configs: Dict[str, ModelC
             final_configs[agent_name] = user_config.model_dump()
         else:
             final_configs[agent_name] = {"provider": "default", **defaults}
+        final_configs[agent_name]["role"] = AGENT_ROLES.get(agent_name, agent_name)
 
+    image_prefetch = None
+    research_prefetch = None
+    if speculative_execution:
+        image_prefetch = SpeculativeCall("image_search", AVAILABLE_TOOLS["image_search"]["function"](query=user_query))
+        if not current_research_history and clarification_mode != "always_ask":
+            research_prefetch = SpeculativeStream("first_research_step", researcher_agent.run(len(current_research_history) + 1, user_query, final_configs["prism-researcher-default"], final_configs["prism-summarizer-large-context"]))
 
     try:
         logging.info("--- STARTING DYNAMIC AGENT EXECUTION (STREAM) ---")
         for i in range(max_steps):
-            yield json.dumps({"event": "log", "data": {"message": "Orchestrator is planning the next step..."}})
-            next_step: PlanStep = await orchestrator.get_next_step(user_query, current_research_history, final_configs["prism-reasoning-core"], clarification_mode)
-            yield json.dumps({"event": "agent_start", "data": next_step.model_dump()})
+            yield {"event": "log", "data": {"message": "Orchestrator is planning the next step..."}}
+            if usage_tracker.exhausted or (usage_tracker.near_limit and current_research_history):
+                logging.warning(f"Usage budget {usage_tracker.fraction_used():.0%} spent; skipping the orchestrator and synthesizing early.")
+                yield {"event": "log", "data": {"message": "Usage budget nearly spent. Synthesizing the findings gathered so far..."}}
+                next_step = PlanStep(task_id=len(current_research_history) + 1, agent="LeadSynthesizer", prompt=f"Write the final report for: {user_query}")
+            else:
+                next_step: PlanStep = await orchestrator.get_next_step(user_query, current_research_history, final_configs["prism-reasoning-core"], clarification_mode)
+
+            # Adoption is decided before agent_start so the client and the history record the prompt that was actually researched.
+            adopted_research = None
+            speculation_reports = []
+            if research_prefetch:
+                if next_step.agent == "ResearcherAgent" and (SPECULATION_PROMPT_MATCH_THRESHOLD <= 0 or cosine_similarity(embed_text(next_step.prompt), embed_text(user_query)) >= SPECULATION_PROMPT_MATCH_THRESHOLD):
+                    adopted_research = research_prefetch
+                    logging.info(f"Adopting the speculative research of the user query in place of the planned prompt '{next_step.prompt}'.")
+                    next_step = next_step.model_copy(update={"prompt": user_query})
+                    speculation_reports.append({"name": research_prefetch.name, "adopted": True})
+                else:
+                    speculation_reports.extend(_discard_speculations(research_prefetch))
+                research_prefetch = None
+
+            yield {"event": "agent_start", "data": next_step}
+            for report in speculation_reports:
+                yield {"event": "speculation", "data": report}
 
             if next_step.agent == "UserClarificationAgent":
+                for report in _discard_speculations(image_prefetch, research_prefetch):
+                    yield {"event": "speculation", "data": report}
                 logging.info("Orchestrator requires user clarification. Pausing stream.")
+                yield _usage_event(usage_tracker)
                 return
 
             agent_output = None
             agent_runner = None
 
-            if next_step.agent == "ResearcherAgent":
+            if adopted_research:
+                agent_runner = adopted_research.adopt()
+            elif next_step.agent == "ResearcherAgent":
                 agent_runner = researcher_agent.run(next_step.task_id, next_step.prompt, final_configs["prism-researcher-default"], final_configs["prism-summarizer-large-context"])
             elif next_step.agent == "CodeExecutor":
                 agent_runner = code_executor.run(next_step.task_id, next_step.prompt, final_configs["prism-coder-agent"])
@@ -103,20 +191,26 @@ async def research_event_stream(user_query: str, model_configs: Dict[str, ModelC
                         code_str = f"**Calculation Result:**\nTask: {hist_item['prompt']}\nResult:\n```\n{output.result}\n```"
                         all_context_parts.append(code_str)
                 context_str = "\n\n---\n\n".join(all_context_parts)
-                image_results = await AVAILABLE_TOOLS["image_search"]["function"](query=user_query)
-                image_urls = [res.link for res in image_results]
-                final_report_output = await lead_synthesizer.run(next_step.task_id, user_query, context_str, final_configs["prism-reasoning-core"])
+                image_search = image_prefetch.adopt() if image_prefetch else AVAILABLE_TOOLS["image_search"]["function"](query=user_query)
+                image_prefetch = None
+                final_report_output, image_urls = await asyncio.gather(
+                    lead_synthesizer.run(next_step.task_id, user_query, context_str, {**final_configs["prism-reasoning-core"], "role": "synthesizer"}),
+                    _fetch_image_urls(image_search)
+                )
                 final_report_output.image_urls = image_urls
                 
-                logging.info("--- AGENT EXECUTION COMPLETE (STREAM) ---")
-                yield json.dumps({"event": "complete", "data": final_report_output.model_dump()})
+                logging.info(f"--- AGENT EXECUTION COMPLETE (STREAM) --- Usage: {usage_tracker.total_tokens} tokens, ${usage_tracker.total['cost_usd']:.4f}")
+                yield _usage_event(usage_tracker)
+                yield {"event": "complete", "data": final_report_output}
                 return
 
             if agent_runner:
                 async for event in agent_runner:
-                    yield json.dumps(event)
                     if event.get("event") == "agent_stop":
-                        output_data = event.get("data", {})
+                        event = {**event, "data": {**event.get("data", {}), "task_id": next_step.task_id}}
+                    yield event
+                    if event.get("event") == "agent_stop":
+                        output_data = event["data"]
                         if next_step.agent == "ResearcherAgent":
                             agent_output = ResearcherOutput.model_validate(output_data)
                         elif next_step.agent == "CodeExecutor":
@@ -126,20 +220,27 @@ async def research_event_stream(user_query: str, model_configs: Dict[str, ModelC
             if agent_output:
                 history_entry = {"task_id": next_step.task_id, "agent": next_step.agent, "prompt": next_step.prompt, "output": agent_output}
                 current_research_history.append(history_entry)
+                yield _usage_event(usage_tracker)
             elif next_step.agent not in ["LeadSynthesizer", "UserClarificationAgent"]:
                 raise Exception(f"Agent {next_step.agent} failed to produce output.")
 
         raise Exception("Research process exceeded maximum step limit.")
     except ExternalApiException as e:
         logging.error(f"Stopping research due to external API error: {e}")
-        yield json.dumps({"event": "error", "data": {"detail": str(e)}})
+        yield {"event": "error", "data": {"detail": str(e)}}
     except Exception as e:
         logging.error(f"An error occurred during the research stream: {e}", exc_info=True)
-        yield json.dumps({"event": "error", "data": {"detail": f"A critical error occurred: {e}"}})
+        yield {"event": "error", "data": {"detail": f"A critical error occurred: {e}"}}
+    finally:
+        _discard_speculations(image_prefetch, research_prefetch)
 
 @app.get("/health")
 async def health_check(): return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    return JSONResponse(status_code=200 if readiness.is_ready else 503, content=readiness.snapshot())
+
 @app.get("/version")
 async def get_version(): return {"version": app.version}
 
@@ -147,6 +248,51 @@ async def get_version(): return {"version": app.version}
 async def get_google_api_usage():
     return {"count": get_search_count()}
 
+@app.get("/v1/status/summary-index")
+async def get_summary_index_stats():
+    return summary_index.get_stats()
+
+@app.get("/v1/status/providers")
+async def get_provider_health():
+    return provider_health.snapshot()
+
+@app.get("/v1/status/cascade")
+async def get_cascade_stats():
+    return cascade_stats.snapshot()
+
+@app.get("/v1/status/fetch-hosts")
+async def get_fetch_host_stats():
+    return fetch_scheduler.snapshot()
+
+@app.post("/v1/admin/profile")
+async def profile_process(duration: Optional[float] = Query(None, gt=0, le=PROFILER_MAX_SECONDS), run_id: Optional[str] = None, output: Literal["json", "collapsed"] = "json", x_admin_token: Optional[str] = Header(None)):
+    # The server listens on all interfaces with open CORS, so admin endpoints only exist once a token is configured.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token.")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already being recorded.")
+
+    async with profile_lock:
+        if run_id:
+            run = run_registry.get(run_id)
+            if run is None: raise HTTPException(status_code=404, detail=f"Research run '{run_id}' not found or expired.")
+            if run.is_complete: raise HTTPException(status_code=409, detail=f"Research run '{run_id}' has already finished.")
+            report = {"run_id": run_id, **await profile_until(run.task, duration or PROFILER_MAX_SECONDS)}
+        else:
+            report = await profile_window(duration or 10)
+
+    if output == "collapsed":
+        lag = report["event_loop_lag"]
+        return PlainTextResponse(report["collapsed"], headers={
+            "Content-Disposition": 'attachment; filename="prism-profile.collapsed"',
+            "X-Event-Loop-Lag-P95-Ms": str(lag["p95_ms"]),
+            "X-Event-Loop-Lag-Max-Ms": str(lag["max_ms"]),
+            "X-Profiler-Samples": str(report["samples"]),
+        })
+    return report
+
 @app.post("/v1/config/keys")
 async def update_api_keys(keys: ApiKeys):
     search.IN_MEMORY_API_KEY, search.IN_MEMORY_CX_ID = keys.google_api_key, keys.google_cx_id
@@ -158,26 +304,6 @@ async def list_models():
     models = [ModelInfo(id=model_id) for model_id in DEFAULT_MODEL_MAPPING.keys()]
     return {"data": models, "object": "list"}
     
-class PollinationsRequest(BaseModel):
-    model: str
-    messages: List[Dict[str, Any]]
-
-@app.post("/v1/internal/pollinations")
-async def proxy_pollinations(request: PollinationsRequest):
-    try:
-        response = await asyncio.to_thread(
-            pollinations_client.chat_completion_sync, request.model, request.messages
-        )
-        return JSONResponse(content=response)
-    except RateLimitException as e:
-        raise HTTPException(status_code=429, detail=str(e))
-    except ServiceUnavailableException as e:
-        raise HTTPException(status_code=503, detail=str(e))
-    except ExternalApiException as e:
-        raise HTTPException(status_code=502, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
 @app.post("/v1/tools/{tool_name}")
 async def use_tool(tool_name: str, payload: Dict[str, Any] = Body(...)):
     if tool_name not in AVAILABLE_TOOLS: raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found.")
@@ -193,12 +319,34 @@ async def use_tool(tool_name: str, payload: Dict[str, Any] = Body(...)):
         logging.error(f"Error using tool {tool_name}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 @app.post("/v1/prism/research/stream")
-async def start_research_stream(request: ResearchRequest):
-    async def event_generator():
-        async for event_data in research_event_stream(request.query, request.model_configs, request.clarification_mode, request.research_history):
-            yield f"data: {event_data}\n\n"
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+async def start_research_stream(request: ResearchRequest, last_event_id: Optional[str] = Header(None)):
+    run, cursor = run_registry.resolve(last_event_id) if last_event_id else (None, 0)
+    if run is None:
+        if last_event_id:
+            # Silently starting over would splice a second run's events onto the client's view and spend quota again.
+            logging.warning(f"Cannot resume from Last-Event-ID '{last_event_id}'; the run is unknown or has expired.")
+            raise HTTPException(status_code=410, detail="This research run has expired or is unknown to the server. Start a new research run to continue.")
+        run = run_registry.start(research_event_stream(request.query, request.model_configs, request.clarification_mode, request.research_history, request.speculative_execution, request.budget), EventEncoder(compact=request.compact_events))
+    else:
+        logging.info(f"Resuming research run {run.run_id} after event {cursor}.")
+    return StreamingResponse(run.sse_frames(cursor), media_type="text/event-stream", headers={**SSE_HEADERS, "X-Run-ID": run.run_id})
+
+@app.get("/v1/prism/research/stream/{run_id}")
+async def resume_research_stream(run_id: str, last_event_id: Optional[str] = Header(None)):
+    run = run_registry.get(run_id)
+    if run is None: raise HTTPException(status_code=404, detail=f"Research run '{run_id}' not found or expired.")
+    resolved_run, cursor = run_registry.resolve(last_event_id) if last_event_id else (None, 0)
+    if resolved_run is not run: cursor = 0
+    return StreamingResponse(run.sse_frames(cursor), media_type="text/event-stream", headers={**SSE_HEADERS, "X-Run-ID": run.run_id})
+
+@app.delete("/v1/prism/research/stream/{run_id}")
+async def cancel_research_stream(run_id: str):
+    run = run_registry.get(run_id)
+    if run is None: raise HTTPException(status_code=404, detail=f"Research run '{run_id}' not found or expired.")
+    return {"run_id": run_id, "cancelled": run.cancel("cancelled by the client")}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,59 +1,105 @@
+import asyncio
 import json
 import logging
-import time
-from curl_cffi import requests
+from typing import AsyncGenerator, Dict, Optional
+
+from config import POLLINATIONS_MAX_IN_FLIGHT
 from exceptions import RateLimitException, ServiceUnavailableException, ExternalApiException
 
 class PollinationsClient:
-    def __init__(self):
+    def __init__(self, max_in_flight: int = POLLINATIONS_MAX_IN_FLIGHT):
         self.api_url = "https://text.pollinations.ai/openai"
         self.headers = {"Content-Type": "application/json"}
         self.max_retries = 3
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            from curl_cffi.requests import AsyncSession
+            self._session = AsyncSession(headers=self.headers, impersonate="chrome120", timeout=120, max_clients=self.max_in_flight)
+        return self._session
 
-    def chat_completion_sync(self, model: str, messages: list[dict]) -> str:
-        payload = {
+    def _payload(self, model: str, messages: list[dict], stream: bool) -> dict:
+        return {
             "model": model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "referrer": "tgpt",
             "temperature": 1.0,
             "top_p": 1.0,
         }
-        
+
+    def _check_status(self, status_code: int):
+        if status_code == 429:
+            raise RateLimitException("The default LLM provider has rate limited your IP. Please try again later or configure a custom model in Settings.")
+        elif status_code >= 500:
+            raise ServiceUnavailableException("The default LLM provider is currently unavailable. Please try again later.")
+        elif status_code >= 400:
+            raise ExternalApiException(f"The default LLM provider returned an unexpected error: {status_code}")
+
+    def _record_usage(self, data: dict, usage: Optional[Dict[str, int]]):
+        reported = data.get("usage") or {}
+        if usage is not None and "prompt_tokens" in reported:
+            usage.update(prompt_tokens=reported["prompt_tokens"], completion_tokens=reported.get("completion_tokens", 0))
+
+    async def chat_completion(self, model: str, messages: list[dict], usage: Optional[Dict[str, int]] = None) -> str:
+        payload = self._payload(model, messages, stream=False)
+
         last_exception = None
         for attempt in range(self.max_retries):
+            response = None
             try:
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    impersonate="chrome120",
-                    timeout=120
-                )
-                response.raise_for_status()
+                async with self._semaphore:
+                    response = await self._get_session().post(self.api_url, json=payload)
+                self._check_status(response.status_code)
                 data = response.json()
+                self._record_usage(data, usage)
                 content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
                 if not content:
                     raise Exception("LLM response was empty or malformed.")
                 return content
-            except requests.errors.HttpError as e:
-                last_exception = e
+            except (RateLimitException, ServiceUnavailableException, ExternalApiException) as e:
                 logging.warning(f"PollinationsClient attempt {attempt + 1}/{self.max_retries} failed with HTTP error: {e}")
-                if e.response.status_code == 429:
-                    raise RateLimitException("The default LLM provider has rate limited your IP. Please try again later or configure a custom model in Settings.")
-                elif e.response.status_code >= 500:
-                    raise ServiceUnavailableException("The default LLM provider is currently unavailable. Please try again later.")
-                else:
-                    raise ExternalApiException(f"The default LLM provider returned an unexpected error: {e.response.status_code}")
+                raise
             except Exception as e:
                 last_exception = e
                 logging.warning(f"PollinationsClient attempt {attempt + 1}/{self.max_retries} failed: {e}")
                 if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                 else:
                     logging.error(f"Error in PollinationsClient after {self.max_retries} retries: {e}")
-                    if 'response' in locals() and response:
+                    if response is not None:
                         logging.error(f"Raw Error Response: {response.text}")
                     raise last_exception
 
-pollinations_client = PollinationsClient()
\ No newline at end of file
+    async def chat_completion_stream(self, model: str, messages: list[dict], usage: Optional[Dict[str, int]] = None) -> AsyncGenerator[str, None]:
+        payload = self._payload(model, messages, stream=True)
+        async with self._semaphore:
+            response = await self._get_session().post(self.api_url, json=payload, stream=True)
+            try:
+                self._check_status(response.status_code)
+                async for line in response.aiter_lines():
+                    line = line.decode("utf-8") if isinstance(line, bytes) else line
+                    if not line.startswith("data:"): continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]": return
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    self._record_usage(chunk, usage)
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+pollinations_client = PollinationsClient()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import PROFILER_SAMPLE_INTERVAL_MS, PROFILER_MAX_SECONDS
+
+MAX_STACK_DEPTH = 128
+LAG_PROBE_INTERVAL_SECONDS = 0.05
+IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float = PROFILER_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.lags: List[float] = []
+        self.sampler_cpu_seconds = 0.0
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _walk(self, frame: Optional[FrameType]) -> Tuple[CodeType, ...]:
+        codes = []
+        while frame is not None and len(codes) < MAX_STACK_DEPTH:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        return tuple(reversed(codes))
+
+    def _sample(self, own_thread_id: int):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id: continue
+            codes = self._walk(frame)
+            if not codes: continue
+            leaf = codes[-1]
+            if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                self.idle_samples += 1
+                continue
+            thread_name = "event-loop" if thread_id == self._loop_thread_id else thread_names.get(thread_id, f"thread-{thread_id}")
+            self.stacks[(thread_name, codes)] += 1
+        self.samples += 1
+
+    def _run_sampler(self):
+        own_thread_id = threading.get_ident()
+        cpu_started_at = time.thread_time()
+        while not self._stop.wait(self.interval):
+            self._sample(own_thread_id)
+        self.sampler_cpu_seconds = time.thread_time() - cpu_started_at
+
+    async def _probe_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_PROBE_INTERVAL_SECONDS
+            await asyncio.sleep(LAG_PROBE_INTERVAL_SECONDS)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def profile(self, until: "asyncio.Future[Any]", max_seconds: float = PROFILER_MAX_SECONDS) -> Dict[str, Any]:
+        self._loop_thread_id = threading.get_ident()
+        sampler = threading.Thread(target=self._run_sampler, name="prism-profiler", daemon=True)
+        lag_probe = asyncio.create_task(self._probe_lag())
+        started_at = time.monotonic()
+        sampler.start()
+        try:
+            await asyncio.wait([until], timeout=min(max_seconds, PROFILER_MAX_SECONDS))
+        finally:
+            self._stop.set()
+            lag_probe.cancel()
+            await asyncio.to_thread(sampler.join)
+        return self.report(time.monotonic() - started_at)
+
+    def collapsed(self) -> str:
+        lines = [
+            ";".join([thread_name, *(self._label(code) for code in codes)]) + f" {count}"
+            for (thread_name, codes), count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def lag_summary(self) -> Dict[str, Optional[float]]:
+        if not self.lags:
+            return {"probes": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+        ordered = sorted(self.lags)
+        def percentile(fraction: float) -> float:
+            return round(1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+        return {
+            "probes": len(ordered),
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(1000 * ordered[-1], 2),
+        }
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        return {
+            "duration_seconds": round(duration, 3),
+            "sample_interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "idle_thread_samples": self.idle_samples,
+            "sampler_cpu_seconds": round(self.sampler_cpu_seconds, 4),
+            "sampler_overhead": round(self.sampler_cpu_seconds / duration, 4) if duration else None,
+            "event_loop_lag": self.lag_summary(),
+            "collapsed": self.collapsed(),
+        }
+
+profile_lock = asyncio.Lock()
+
+async def profile_window(seconds: float) -> Dict[str, Any]:
+    logging.info(f"Profiler: Sampling all threads for {seconds:.1f}s.")
+    return await SamplingProfiler().profile(asyncio.get_running_loop().create_future(), max_seconds=seconds)
+
+async def profile_until(task: "asyncio.Future[Any]", max_seconds: float) -> Dict[str, Any]:
+    logging.info(f"Profiler: Sampling all threads until the run finishes (at most {max_seconds:.1f}s).")
+    return await SamplingProfiler().profile(task, max_seconds=max_seconds)
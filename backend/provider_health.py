@@ -0,0 +1,92 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 50
+MIN_SAMPLES_FOR_P95 = 5
+DEFAULT_HEDGE_DELAY_SECONDS = 20.0
+MIN_HEDGE_DELAY_SECONDS = 2.0
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN_SECONDS = 60.0
+RATE_LIMIT_COOLDOWN_SECONDS = 120.0
+
+class ProviderStats:
+    def __init__(self):
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def record_success(self, latency: float):
+        self.calls += 1
+        self.latencies.append(latency)
+        self.ewma_latency = latency if self.ewma_latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, rate_limited: bool = False):
+        self.calls += 1
+        self.failures += 1
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        if rate_limited:
+            self.open_until = time.monotonic() + RATE_LIMIT_COOLDOWN_SECONDS
+        elif self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + CIRCUIT_COOLDOWN_SECONDS
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def p95_latency(self) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES_FOR_P95:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def score(self) -> float:
+        latency = self.ewma_latency if self.ewma_latency is not None else DEFAULT_HEDGE_DELAY_SECONDS
+        return latency * (1 + 4 * self.error_rate)
+
+class ProviderHealth:
+    def __init__(self):
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def key(self, model_config: Dict[str, Any]) -> str:
+        return f"{model_config.get('provider', 'default')}:{model_config.get('model') or ''}:{model_config.get('baseUrl') or ''}"
+
+    def stats(self, model_config: Dict[str, Any]) -> ProviderStats:
+        return self._stats.setdefault(self.key(model_config), ProviderStats())
+
+    def order(self, chain: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        available = [config for config in chain if self.stats(config).is_available()]
+        if not available:
+            return sorted(chain, key=lambda config: self.stats(config).open_until)
+
+        primary, backups = available[0], available[1:]
+        if primary is chain[0] and self.stats(primary).error_rate < 0.5:
+            return [primary] + sorted(backups, key=lambda config: self.stats(config).score())
+        return sorted(available, key=lambda config: self.stats(config).score())
+
+    def hedge_delay(self, model_config: Dict[str, Any]) -> float:
+        p95 = self.stats(model_config).p95_latency()
+        return DEFAULT_HEDGE_DELAY_SECONDS if p95 is None else max(MIN_HEDGE_DELAY_SECONDS, p95)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "ewma_latency": stats.ewma_latency,
+                "p95_latency": stats.p95_latency(),
+                "error_rate": round(stats.error_rate, 3),
+                "circuit_open": not stats.is_available(),
+            }
+            for key, stats in self._stats.items()
+        }
+
+provider_health = ProviderHealth()
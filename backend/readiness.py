@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional, Set
+
+class Readiness:
+    def __init__(self):
+        self._subsystems: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def mark(self, name: str, status: str, detail: Optional[str] = None, optional: Optional[bool] = None):
+        entry = self._subsystems.setdefault(name, {"started_at": time.monotonic(), "optional": False})
+        if optional is not None:
+            entry["optional"] = optional
+        entry.update(status=status, detail=detail)
+        if status != "starting":
+            entry["startup_seconds"] = round(time.monotonic() - entry["started_at"], 3)
+
+    def track(self, name: str, startup: Awaitable[Any], optional: bool = False) -> asyncio.Task:
+        # An optional subsystem only has to finish starting; if it fails the server reports itself degraded but ready.
+        self.mark(name, "starting", optional=optional)
+
+        async def runner():
+            try:
+                detail = await startup
+                self.mark(name, "ready", detail)
+            except asyncio.CancelledError:
+                self.mark(name, "failed", "Startup was cancelled.")
+                raise
+            except Exception as e:
+                logging.error(f"Startup of subsystem '{name}' failed: {e}", exc_info=True)
+                self.mark(name, "failed", str(e))
+
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @property
+    def is_ready(self) -> bool:
+        return all(entry["status"] == "ready" or (entry["optional"] and entry["status"] != "starting") for entry in self._subsystems.values())
+
+    @property
+    def degraded(self) -> list[str]:
+        return [name for name, entry in self._subsystems.items() if entry["optional"] and entry["status"] == "failed"]
+
+    async def wait(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.wait()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready,
+            "degraded": self.degraded,
+            "subsystems": {
+                name: {key: value for key, value in entry.items() if key != "started_at"}
+                for name, entry in self._subsystems.items()
+            },
+        }
+
+readiness = Readiness()
@@ -0,0 +1,26 @@
+import logging
+
+from .base import SandboxBackend
+from .subprocess_backend import SubprocessSandbox
+
+async def create_sandbox(name: str = "auto") -> SandboxBackend:
+    name = name.lower()
+    if name in ("docker", "auto"):
+        from .docker_backend import DockerSandbox
+        sandbox = DockerSandbox()
+        await sandbox.start()
+        if sandbox.is_available or name == "docker":
+            return sandbox
+        fallback = SubprocessSandbox()
+        if not fallback.confines_filesystem:
+            # Without Landlock the subprocess backend cannot keep code away from .env, so it is only used when asked for explicitly.
+            logging.warning("Docker sandbox unavailable and the subprocess sandbox cannot confine the filesystem here; code execution is disabled. Set SANDBOX_BACKEND=subprocess to accept the weaker isolation.")
+            return sandbox
+        logging.warning("Docker sandbox unavailable, falling back to the Landlock-confined subprocess sandbox.")
+        await fallback.start()
+        return fallback
+    elif name != "subprocess":
+        raise ValueError(f"Unknown sandbox backend: '{name}'")
+    sandbox = SubprocessSandbox()
+    await sandbox.start()
+    return sandbox
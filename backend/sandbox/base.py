@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+EXECUTION_TIMEOUT_SECONDS = 10
+MAX_MEMORY_MB = 128
+
+class SandboxBackend(ABC):
+    name = "base"
+
+    @property
+    @abstractmethod
+    def is_available(self) -> bool:
+        ...
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def execute(self, code: str) -> str:
+        ...
+
+    async def close(self):
+        pass
@@ -0,0 +1,79 @@
+import logging
+import asyncio
+import docker
+import sys
+from docker.errors import ContainerError
+
+from .base import SandboxBackend, EXECUTION_TIMEOUT_SECONDS, MAX_MEMORY_MB
+
+DOCKER_IMAGE = "python:3.11-slim"
+DOCKER_NETWORK = "prism-sandbox-net"
+
+class DockerSandbox(SandboxBackend):
+    name = "docker"
+
+    def __init__(self):
+        self.docker_client = None
+
+    async def start(self):
+        await asyncio.to_thread(self._connect)
+
+    def _connect(self):
+        try:
+            if sys.platform == "win32":
+                self.docker_client = docker.DockerClient(base_url='npipe:////./pipe/docker_engine')
+            else:
+                self.docker_client = docker.from_env()
+
+            self.docker_client.ping()
+            logging.info("Docker client initialized successfully.")
+            self._setup_docker_environment()
+        except Exception as e:
+            logging.error(f"Failed to initialize Docker client. Please ensure Docker is running. Error: {e}")
+            self.docker_client = None
+
+    @property
+    def is_available(self) -> bool:
+        return self.docker_client is not None
+
+    def _setup_docker_environment(self):
+        try:
+            self.docker_client.images.get(DOCKER_IMAGE)
+        except docker.errors.ImageNotFound:
+            logging.warning(f"Image '{DOCKER_IMAGE}' not found. Pulling from Docker Hub...")
+            try:
+                self.docker_client.images.pull(DOCKER_IMAGE)
+            except Exception as e:
+                logging.error(f"CRITICAL: Failed to pull '{DOCKER_IMAGE}'. Run 'docker pull {DOCKER_IMAGE}' manually. Error: {e}")
+                self.docker_client = None 
+                return
+        try:
+            self.docker_client.networks.get(DOCKER_NETWORK)
+        except docker.errors.NotFound:
+            self.docker_client.networks.create(DOCKER_NETWORK, internal=True)
+
+    async def execute(self, code: str) -> str:
+        def sync_docker_run():
+            container = None
+            try:
+                container = self.docker_client.containers.create(
+                    image=DOCKER_IMAGE,
+                    command=["python", "-c", code],
+                    mem_limit=f"{MAX_MEMORY_MB}m",
+                    network=DOCKER_NETWORK
+                )
+                container.start()
+                result = container.wait(timeout=EXECUTION_TIMEOUT_SECONDS)
+                stdout = container.logs(stdout=True, stderr=False).decode('utf-8')
+                stderr = container.logs(stdout=False, stderr=True).decode('utf-8')
+                return stdout if result['StatusCode'] == 0 else f"Execution Error:\n{stderr}"
+            except docker.errors.Timeout: return f"Execution Error: Timeout after {EXECUTION_TIMEOUT_SECONDS} seconds."
+            except ContainerError as e: return f"Container Error: {e.stderr.decode('utf-8') if e.stderr else 'Unknown'}"
+            except Exception as e: return f"Docker Infrastructure Error: {e}"
+            finally:
+                if container: container.remove(force=True)
+        return await asyncio.to_thread(sync_docker_run)
+
+    async def close(self):
+        if self.docker_client:
+            await asyncio.to_thread(self.docker_client.close)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+from functools import partial
+from typing import Optional, Tuple
+
+from .base import SandboxBackend, EXECUTION_TIMEOUT_SECONDS, MAX_MEMORY_MB
+
+try:
+    import ctypes
+    import resource
+    _libc = ctypes.CDLL(None, use_errno=True)
+except (ImportError, OSError):
+    resource = None
+    _libc = None
+
+POOL_SIZE = 2
+ADDRESS_SPACE_MB = max(MAX_MEMORY_MB, 256)
+MAX_OUTPUT_BYTES = 64 * 1024
+MAX_FILE_SIZE_BYTES = 1024 * 1024
+MAX_OPEN_FILES = 32
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+# Landlock (Linux 5.13+) confines the interpreter to the paths below; the syscall numbers are shared by all architectures.
+SYS_LANDLOCK_CREATE_RULESET, SYS_LANDLOCK_ADD_RULE, SYS_LANDLOCK_RESTRICT_SELF = 444, 445, 446
+LANDLOCK_RULE_PATH_BENEATH = 1
+LANDLOCK_CREATE_RULESET_VERSION = 1
+LANDLOCK_ACCESS_EXECUTE, LANDLOCK_ACCESS_WRITE_FILE, LANDLOCK_ACCESS_READ_FILE, LANDLOCK_ACCESS_READ_DIR = 1, 2, 4, 8
+LANDLOCK_ACCESS_ALL_V1 = (1 << 13) - 1
+PR_SET_NO_NEW_PRIVS = 38
+READ_ONLY_FILES = ("/etc/ld.so.cache", "/etc/localtime", "/dev/urandom")
+
+BLOCKED_AUDIT_EVENTS = ("os.fork", "os.forkpty", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "subprocess.Popen", "pty.spawn")
+
+# RLIMIT_NPROC is not enforced for root, so process creation is also refused from an audit hook.
+BOOTSTRAP = f"""
+import sys
+def _deny(event, args, blocked={BLOCKED_AUDIT_EVENTS!r}):
+    if event in blocked:
+        raise PermissionError(f"{{event}} is not permitted in the sandbox")
+code = sys.stdin.read()
+sys.addaudithook(_deny)
+del _deny
+exec(compile(code, '<sandbox>', 'exec'), {{'__name__': '__main__'}})
+"""
+SANDBOX_ENV = {"PATH": "/usr/bin:/bin", "LANG": "C.UTF-8", "PYTHONIOENCODING": "utf-8", "PYTHONDONTWRITEBYTECODE": "1"}
+
+def _unshare_network():
+    if _libc is None or sys.platform != "linux": return
+    for flags in (CLONE_NEWNET, CLONE_NEWUSER | CLONE_NEWNET):
+        if _libc.unshare(flags) == 0:
+            return
+
+def _read_only_paths() -> list[str]:
+    # The interpreter, its standard library and the shared libraries it loads; nothing under the backend checkout.
+    paths = {sys.base_prefix, sys.prefix, os.path.dirname(os.path.realpath(sys.executable)), "/usr", "/lib", "/lib64", *READ_ONLY_FILES}
+    return sorted(path for path in paths if os.path.exists(path))
+
+def landlock_abi() -> int:
+    if _libc is None or sys.platform != "linux": return 0
+    return max(0, _libc.syscall(SYS_LANDLOCK_CREATE_RULESET, None, 0, LANDLOCK_CREATE_RULESET_VERSION))
+
+def _confine_filesystem(workdir: str):
+    ruleset_fd = _libc.syscall(SYS_LANDLOCK_CREATE_RULESET, struct.pack("=Q", LANDLOCK_ACCESS_ALL_V1), 8, 0)
+    if ruleset_fd < 0:
+        raise OSError(ctypes.get_errno(), "landlock_create_ruleset failed")
+    read_access = LANDLOCK_ACCESS_EXECUTE | LANDLOCK_ACCESS_READ_FILE | LANDLOCK_ACCESS_READ_DIR
+    rules = [(path, read_access) for path in _read_only_paths()]
+    rules += [(workdir, LANDLOCK_ACCESS_ALL_V1), ("/dev/null", LANDLOCK_ACCESS_READ_FILE | LANDLOCK_ACCESS_WRITE_FILE)]
+    for path, access in rules:
+        if not os.path.isdir(path):
+            # Directory rights are rejected on files.
+            access &= LANDLOCK_ACCESS_EXECUTE | LANDLOCK_ACCESS_READ_FILE | LANDLOCK_ACCESS_WRITE_FILE
+        fd = os.open(path, os.O_PATH | os.O_CLOEXEC)
+        try:
+            if _libc.syscall(SYS_LANDLOCK_ADD_RULE, ruleset_fd, LANDLOCK_RULE_PATH_BENEATH, struct.pack("=Qi", access, fd), 0) != 0:
+                raise OSError(ctypes.get_errno(), f"landlock_add_rule failed for {path}")
+        finally:
+            os.close(fd)
+    if _libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0 or _libc.syscall(SYS_LANDLOCK_RESTRICT_SELF, ruleset_fd, 0) != 0:
+        raise OSError(ctypes.get_errno(), "landlock_restrict_self failed")
+    os.close(ruleset_fd)
+
+def _restrict_child(workdir: str, confine_filesystem: bool):
+    os.setsid()
+    resource.setrlimit(resource.RLIMIT_CPU, (EXECUTION_TIMEOUT_SECONDS, EXECUTION_TIMEOUT_SECONDS + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (ADDRESS_SPACE_MB * 1024 * 1024, ADDRESS_SPACE_MB * 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_SIZE_BYTES, MAX_FILE_SIZE_BYTES))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (MAX_OPEN_FILES, MAX_OPEN_FILES))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    _unshare_network()
+    if confine_filesystem:
+        _confine_filesystem(workdir)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+class WarmProcess:
+    def __init__(self, process: asyncio.subprocess.Process, workdir: str):
+        self.process = process
+        self.workdir = workdir
+
+    def kill(self):
+        if self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def cleanup(self):
+        self.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class SubprocessSandbox(SandboxBackend):
+    name = "subprocess"
+
+    def __init__(self, pool_size: int = POOL_SIZE):
+        self.pool_size = pool_size
+        self._pool: Optional[asyncio.Queue] = None
+        self._refills: set[asyncio.Task] = set()
+        self.confines_filesystem = landlock_abi() > 0
+
+    @property
+    def is_available(self) -> bool:
+        return resource is not None and sys.platform != "win32"
+
+    async def start(self):
+        if self._pool is not None or not self.is_available: return
+        self._pool = asyncio.Queue()
+        for _ in range(self.pool_size):
+            await self._pool.put(await self._spawn())
+        logging.info(f"SubprocessSandbox: Pre-forked {self.pool_size} sandboxed Python interpreters.")
+        if not self.confines_filesystem:
+            logging.warning("SubprocessSandbox: Landlock is unavailable, so sandboxed code can read any file this server can, including .env.")
+
+    async def _spawn(self) -> WarmProcess:
+        workdir = tempfile.mkdtemp(prefix="prism-sandbox-")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-I", "-S", "-c", BOOTSTRAP,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            cwd=workdir, env={**SANDBOX_ENV, "TMPDIR": workdir}, preexec_fn=partial(_restrict_child, workdir, self.confines_filesystem)
+        )
+        return WarmProcess(process, workdir)
+
+    async def _refill(self):
+        try:
+            await self._pool.put(await self._spawn())
+        except Exception as e:
+            logging.error(f"SubprocessSandbox: Failed to spawn a replacement interpreter. Error: {e}")
+
+    async def _acquire(self) -> WarmProcess:
+        await self.start()
+        while not self._pool.empty():
+            warm = self._pool.get_nowait()
+            if warm.process.returncode is None:
+                break
+            warm.cleanup()
+        else:
+            warm = await self._spawn()
+        refill = asyncio.create_task(self._refill())
+        self._refills.add(refill)
+        refill.add_done_callback(self._refills.discard)
+        return warm
+
+    async def _read_capped(self, stream: asyncio.StreamReader) -> Tuple[bytes, bool]:
+        output, truncated = bytearray(), False
+        while chunk := await stream.read(65536):
+            remaining = MAX_OUTPUT_BYTES - len(output)
+            output += chunk[:remaining]
+            truncated = truncated or len(chunk) > remaining
+        return bytes(output), truncated
+
+    async def execute(self, code: str) -> str:
+        warm = await self._acquire()
+        process = warm.process
+        try:
+            process.stdin.write(code.encode("utf-8"))
+            await process.stdin.drain()
+            process.stdin.close()
+            (stdout, stdout_truncated), (stderr, _), returncode = await asyncio.wait_for(
+                asyncio.gather(self._read_capped(process.stdout), self._read_capped(process.stderr), process.wait()),
+                timeout=EXECUTION_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            return f"Execution Error: Timeout after {EXECUTION_TIMEOUT_SECONDS} seconds."
+        except Exception as e:
+            return f"Sandbox Infrastructure Error: {e}"
+        finally:
+            warm.cleanup()
+
+        if returncode != 0:
+            if returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+                return f"Execution Error: Resource limit exceeded (signal {-returncode})."
+            return f"Execution Error:\n{stderr.decode('utf-8', errors='replace')}"
+        result = stdout.decode("utf-8", errors="replace")
+        return result + "\n[output truncated]" if stdout_truncated else result
+
+    async def close(self):
+        for refill in list(self._refills):
+            refill.cancel()
+        if self._pool is None: return
+        while not self._pool.empty():
+            self._pool.get_nowait().cleanup()
+        self._pool = None
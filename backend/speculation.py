@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Dict
+
+class SpeculativeCall:
+    def __init__(self, name: str, awaitable: Awaitable[Any]):
+        self.name = name
+        self.started_at = time.monotonic()
+        self.task = asyncio.ensure_future(awaitable)
+        logging.info(f"Speculation: Started '{self.name}'.")
+
+    async def adopt(self) -> Any:
+        logging.info(f"Speculation: Adopted '{self.name}' after {time.monotonic() - self.started_at:.2f}s.")
+        return await self.task
+
+    def discard(self) -> Dict[str, Any]:
+        report = {"name": self.name, "adopted": False, "completed": self.task.done(), "wasted_seconds": round(time.monotonic() - self.started_at, 3)}
+        if self.task.done() and not self.task.cancelled():
+            self.task.exception()
+        self.task.cancel()
+        logging.info(f"Speculation: Discarded '{self.name}', wasting {report['wasted_seconds']}s of work.")
+        return report
+
+class SpeculativeStream(SpeculativeCall):
+    def __init__(self, name: str, source: AsyncIterator[Dict[str, Any]]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._events_produced = 0
+        self._search_queries = 0
+        super().__init__(name, self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Dict[str, Any]]):
+        try:
+            async for event in source:
+                self._events_produced += 1
+                if event.get("event") == "queries_generated":
+                    self._search_queries += len(event["data"]["queries"])
+                await self._queue.put(event)
+        finally:
+            await self._queue.put(None)
+
+    async def adopt(self) -> AsyncGenerator[Dict[str, Any], None]:
+        logging.info(f"Speculation: Adopted '{self.name}' after {time.monotonic() - self.started_at:.2f}s with {self._events_produced} events already produced.")
+        try:
+            while (event := await self._queue.get()) is not None:
+                yield event
+            await self.task
+        finally:
+            self.task.cancel()
+
+    def discard(self) -> Dict[str, Any]:
+        # Discarded events never reach the client, so the searches they spent are reported here for its quota counter.
+        return {**super().discard(), "events_discarded": self._events_produced, "search_queries": self._search_queries}
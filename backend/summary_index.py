@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from config import (
+    SUMMARY_INDEX_DIR, SUMMARY_INDEX_TTL_HOURS, SUMMARY_INDEX_SIMILARITY_THRESHOLD,
+    SUMMARY_INDEX_MIN_RELEVANCE, SUMMARY_INDEX_MAX_RESULTS
+)
+from embeddings import EMBEDDING_DIM, embed_text
+from agents.schemas import SummarizedContent
+
+class SummaryIndex:
+    def __init__(self, index_dir: str = SUMMARY_INDEX_DIR, ttl_hours: float = SUMMARY_INDEX_TTL_HOURS, similarity_threshold: float = SUMMARY_INDEX_SIMILARITY_THRESHOLD, min_relevance: int = SUMMARY_INDEX_MIN_RELEVANCE, max_results: int = SUMMARY_INDEX_MAX_RESULTS):
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.entries_path = os.path.join(index_dir, "entries.jsonl")
+        self.index_dir = index_dir
+        self.ttl_seconds = ttl_hours * 3600
+        self.similarity_threshold = similarity_threshold
+        self.min_relevance = min_relevance
+        self.max_results = max_results
+        self._entries: List[dict] = []
+        self._vectors: Optional[np.memmap] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "summaries_reused": 0, "summaries_added": 0}
+
+    def _load(self):
+        if self._loaded: return
+        self._loaded = True
+        os.makedirs(self.index_dir, exist_ok=True)
+        entries = []
+        if os.path.exists(self.entries_path):
+            with open(self.entries_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+        row_count = os.path.getsize(self.vectors_path) // (EMBEDDING_DIM * 4) if os.path.exists(self.vectors_path) else 0
+        count = min(len(entries), row_count)
+        vectors = np.fromfile(self.vectors_path, dtype=np.float32, count=count * EMBEDDING_DIM).reshape(count, EMBEDDING_DIM) if count else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        now = time.time()
+        keep = [i for i in range(count) if now - entries[i]["created_at"] <= self.ttl_seconds]
+        if len(keep) != len(entries) or count != row_count:
+            logging.info(f"SummaryIndex: Compacting index from {len(entries)} to {len(keep)} entries.")
+            self._rewrite([entries[i] for i in keep], vectors[keep])
+            entries = [entries[i] for i in keep]
+        self._entries = entries
+        logging.info(f"SummaryIndex: Loaded {len(self._entries)} cached summaries from {self.index_dir}.")
+
+    def load(self) -> str:
+        with self._lock:
+            self._load()
+            return f"{len(self._entries)} cached summaries"
+
+    def _rewrite(self, entries: List[dict], vectors: np.ndarray):
+        with open(self.entries_path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(self.vectors_path + ".tmp")
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        os.replace(self.entries_path + ".tmp", self.entries_path)
+        self._vectors = None
+
+    def _matrix(self) -> np.ndarray:
+        count = len(self._entries)
+        if count == 0:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] != count:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, EMBEDDING_DIM))
+        return self._vectors
+
+    def lookup(self, research_prompt: str) -> List[SummarizedContent]:
+        with self._lock:
+            self._load()
+            self._stats["lookups"] += 1
+            matrix = self._matrix()
+            if matrix.shape[0] == 0:
+                return []
+
+            similarities = matrix @ embed_text(research_prompt)
+            created_at = np.fromiter((entry["created_at"] for entry in self._entries), dtype=np.float64, count=len(self._entries))
+            candidates = np.flatnonzero((similarities >= self.similarity_threshold) & (time.time() - created_at <= self.ttl_seconds))
+
+            results, seen_urls = [], set()
+            for i in candidates[np.argsort(-similarities[candidates])]:
+                entry = self._entries[i]
+                if entry["url"] in seen_urls or entry["relevance_score"] < self.min_relevance: continue
+                seen_urls.add(entry["url"])
+                results.append(SummarizedContent.model_validate(entry["summary"]))
+                if len(results) >= self.max_results: break
+
+            if results:
+                self._stats["hits"] += 1
+                self._stats["summaries_reused"] += len(results)
+            return results
+
+    def add(self, research_prompt: str, summaries: List[SummarizedContent]):
+        summaries = [summary for summary in summaries if summary.relevance_score >= self.min_relevance]
+        if not summaries: return
+        with self._lock:
+            self._load()
+            vector = embed_text(research_prompt).astype(np.float32).tobytes()
+            now = time.time()
+            with open(self.vectors_path, "ab") as vectors_file, open(self.entries_path, "a", encoding="utf-8") as entries_file:
+                for summary in summaries:
+                    entry = {"url": summary.url, "relevance_score": summary.relevance_score, "prompt": research_prompt, "created_at": now, "summary": summary.model_dump()}
+                    vectors_file.write(vector)
+                    entries_file.write(json.dumps(entry) + "\n")
+                    self._entries.append(entry)
+            self._stats["summaries_added"] += len(summaries)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {**self._stats, "hit_rate": self._stats["hits"] / lookups if lookups else 0.0, "size": len(self._entries)}
+
+summary_index = SummaryIndex()
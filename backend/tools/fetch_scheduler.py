@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+from config import (
+    FETCH_STATS_PATH, FETCH_PER_HOST_CONCURRENCY, FETCH_DEFAULT_TIMEOUT_SECONDS, FETCH_MIN_TIMEOUT_SECONDS,
+    FETCH_LATENCY_BUDGET_MULTIPLIER, FETCH_PENALTY_SECONDS
+)
+
+EWMA_ALPHA = 0.3
+FAILURES_BEFORE_PENALTY = 2
+MAX_PENALTY_SECONDS = 6 * 3600
+MAX_TRACKED_HOSTS = 2000
+SAVE_INTERVAL_SECONDS = 30
+
+class HostStats:
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.ewma_latency: Optional[float] = data.get("ewma_latency")
+        self.failure_rate: float = data.get("failure_rate", 0.0)
+        self.requests: int = data.get("requests", 0)
+        self.timeouts: int = data.get("timeouts", 0)
+        self.blocked: int = data.get("blocked", 0)
+        self.consecutive_failures: int = data.get("consecutive_failures", 0)
+        self.penalized_until: float = data.get("penalized_until", 0.0)
+        self.last_seen: float = data.get("last_seen", 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def is_penalized(self) -> bool:
+        return time.time() < self.penalized_until
+
+    def priority(self) -> float:
+        latency = self.ewma_latency if self.ewma_latency is not None else FETCH_DEFAULT_TIMEOUT_SECONDS / 2
+        return latency * (1 + 4 * self.failure_rate)
+
+class FetchScheduler:
+    def __init__(self, stats_path: str = FETCH_STATS_PATH, per_host_limit: int = FETCH_PER_HOST_CONCURRENCY):
+        self.stats_path = stats_path
+        self.per_host_limit = per_host_limit
+        self._hosts: Dict[str, HostStats] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loaded = False
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> str:
+        host = (urlsplit(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def stats(self, url: str) -> HostStats:
+        self._load()
+        return self._hosts.setdefault(self.host(url), HostStats())
+
+    def _peek(self, url: str) -> HostStats:
+        self._load()
+        return self._hosts.get(self.host(url)) or HostStats()
+
+    def should_skip(self, url: str) -> bool:
+        return self._peek(url).is_penalized()
+
+    def priority(self, url: str) -> float:
+        return self._peek(url).priority()
+
+    def timeout_for(self, url: str) -> float:
+        latency = self._peek(url).ewma_latency
+        if latency is None:
+            return FETCH_DEFAULT_TIMEOUT_SECONDS
+        return min(FETCH_DEFAULT_TIMEOUT_SECONDS, max(FETCH_MIN_TIMEOUT_SECONDS, FETCH_LATENCY_BUDGET_MULTIPLIER * latency))
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        semaphore = self._semaphores.setdefault(self.host(url), asyncio.Semaphore(self.per_host_limit))
+        async with semaphore:
+            yield
+
+    def record_success(self, url: str, latency: float):
+        stats = self.stats(url)
+        stats.ewma_latency = latency if stats.ewma_latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats.ewma_latency
+        stats.failure_rate = (1 - EWMA_ALPHA) * stats.failure_rate
+        stats.consecutive_failures = 0
+        stats.penalized_until = 0.0
+        self._touch(stats)
+
+    def record_failure(self, url: str, latency: float, timed_out: bool = False, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        stats = self.stats(url)
+        stats.failure_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * stats.failure_rate
+        if timed_out:
+            stats.timeouts += 1
+            stats.ewma_latency = latency if stats.ewma_latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats.ewma_latency
+        if status_code in (403, 429):
+            stats.blocked += 1
+
+        if timed_out or status_code in (403, 429):
+            stats.consecutive_failures += 1
+            if status_code == 429 or stats.consecutive_failures >= FAILURES_BEFORE_PENALTY:
+                penalty = retry_after or FETCH_PENALTY_SECONDS * 2 ** max(0, stats.consecutive_failures - FAILURES_BEFORE_PENALTY)
+                stats.penalized_until = time.time() + min(MAX_PENALTY_SECONDS, penalty)
+                logging.warning(f"FetchScheduler: Skipping host '{self.host(url)}' for {min(MAX_PENALTY_SECONDS, penalty):.0f}s after repeated timeouts or blocks.")
+        self._touch(stats)
+
+    def _touch(self, stats: HostStats):
+        stats.requests += 1
+        stats.last_seen = time.time()
+        self._dirty = True
+        if time.monotonic() - self._last_saved >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def _load(self):
+        if self._loaded: return
+        self._loaded = True
+        if not os.path.exists(self.stats_path): return
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                self._hosts = {host: HostStats(data) for host, data in json.load(f).items()}
+            logging.info(f"FetchScheduler: Loaded latency history for {len(self._hosts)} hosts.")
+        except (OSError, ValueError) as e:
+            logging.warning(f"FetchScheduler: Ignoring unreadable host stats at {self.stats_path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            self._dirty = False
+            self._last_saved = time.monotonic()
+            hosts = sorted(self._hosts.items(), key=lambda item: item[1].last_seen, reverse=True)[:MAX_TRACKED_HOSTS]
+            try:
+                os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+                with open(self.stats_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({host: stats.to_dict() for host, stats in hosts}, f)
+                os.replace(self.stats_path + ".tmp", self.stats_path)
+            except OSError as e:
+                logging.warning(f"FetchScheduler: Failed to persist host stats: {e}")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        self._load()
+        return {
+            host: {**stats.to_dict(), "penalized": stats.is_penalized()}
+            for host, stats in sorted(self._hosts.items(), key=lambda item: item[1].last_seen, reverse=True)
+        }
+
+fetch_scheduler = FetchScheduler()
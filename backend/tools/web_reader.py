@@ -1,23 +1,52 @@
 import httpx
-from bs4 import BeautifulSoup
-from readability import Document
 from .schemas import WebReaderResult
 import logging
 import io
-from pypdf import PdfReader
-from fake_useragent import UserAgent
 import asyncio
+import time
+from functools import lru_cache
+from typing import Optional
+from .fetch_scheduler import fetch_scheduler
 
-ua = UserAgent()
+@lru_cache(maxsize=1)
+def _get_user_agent():
+    from fake_useragent import UserAgent
+    return UserAgent()
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after", "")
+    return float(value) if value.isdigit() else None
+
+async def _fetch(url: str, headers: dict) -> Optional[httpx.Response]:
+    async with fetch_scheduler.slot(url):
+        if fetch_scheduler.should_skip(url):
+            logging.info(f"Skipping {url}: host '{fetch_scheduler.host(url)}' recently timed out or blocked us.")
+            return None
+        started_at = time.monotonic()
+        try:
+            async with httpx.AsyncClient(headers=headers, follow_redirects=True, timeout=fetch_scheduler.timeout_for(url)) as client:
+                response = await client.get(url)
+                response.raise_for_status()
+        except httpx.TimeoutException:
+            fetch_scheduler.record_failure(url, time.monotonic() - started_at, timed_out=True)
+            raise
+        except httpx.HTTPStatusError as e:
+            fetch_scheduler.record_failure(url, time.monotonic() - started_at, status_code=e.response.status_code, retry_after=_retry_after_seconds(e.response))
+            raise
+        except httpx.HTTPError:
+            fetch_scheduler.record_failure(url, time.monotonic() - started_at)
+            raise
+        fetch_scheduler.record_success(url, time.monotonic() - started_at)
+        return response
 
 async def read_website(url: str) -> WebReaderResult:
     logging.info(f"Reading website content from: {url}")
-    headers = {'User-Agent': ua.random}
+    headers = {'User-Agent': _get_user_agent().random}
     
     try:
-        async with httpx.AsyncClient(headers=headers, follow_redirects=True, timeout=10.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        response = await _fetch(url, headers)
+        if response is None:
+            return WebReaderResult(url=url, title="Error", content="Could not retrieve content from URL. Reason: host skipped after recent timeouts or blocks.")
 
         content_type = response.headers.get("content-type", "").lower()
         is_pdf = "application/pdf" in content_type
@@ -26,6 +55,7 @@ async def read_website(url: str) -> WebReaderResult:
             logging.info(f"PDF content type detected. Parsing with pypdf: {url}")
             
             def sync_parse_pdf(pdf_content: bytes) -> WebReaderResult:
+                from pypdf import PdfReader
                 pdf_stream = io.BytesIO(pdf_content)
                 reader = PdfReader(pdf_stream)
                 title = "PDF Document"
@@ -37,6 +67,8 @@ async def read_website(url: str) -> WebReaderResult:
             return await asyncio.to_thread(sync_parse_pdf, response.content)
         else:
             logging.info(f"HTML content type detected. Parsing with readability: {url}")
+            from bs4 import BeautifulSoup
+            from readability import Document
             doc = Document(response.text)
             title = doc.title()
             content_html = doc.summary()
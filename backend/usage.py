@@ -0,0 +1,100 @@
+import re
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from config import MODEL_PRICING, USAGE_BUDGET_SOFT_LIMIT
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    # Without a provider tokenizer, word pieces average about four characters; punctuation is roughly one token each.
+    if not text: return 0
+    return sum(max(1, len(piece) // 4) for piece in TOKEN_PATTERN.findall(text))
+
+def estimate_message_tokens(messages: list[dict]) -> int:
+    return sum(4 + estimate_tokens(str(message.get("content", ""))) for message in messages)
+
+def model_price(model_config: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    provider, model = model_config.get("provider", "default"), model_config.get("model") or ""
+    if provider in ("default", "pollinations"):
+        return (0.0, 0.0)
+    for key in (f"{provider}:{model}", model):
+        if key in MODEL_PRICING:
+            return tuple(MODEL_PRICING[key])
+    model = model.rsplit("/", 1)[-1]
+    prefixes = [key for key in MODEL_PRICING if model.startswith(key)]
+    return tuple(MODEL_PRICING[max(prefixes, key=len)]) if prefixes else None
+
+class UsageTracker:
+    def __init__(self, max_tokens: Optional[int] = None, max_cost_usd: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.total = self._bucket()
+        self.by_role: Dict[str, Dict[str, Any]] = {}
+        self.by_model: Dict[str, Dict[str, Any]] = {}
+
+    def _bucket(self) -> Dict[str, Any]:
+        return {"calls": 0, "estimated_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+    def record(self, role: Optional[str], model_config: Dict[str, Any], prompt_tokens: int, completion_tokens: int, estimated: bool):
+        price = model_price(model_config)
+        cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000 if price else 0.0
+        model_key = f"{model_config.get('provider', 'default')}:{model_config.get('model') or ''}"
+        for bucket in (self.total, self.by_role.setdefault(role or "unknown", self._bucket()), self.by_model.setdefault(model_key, self._bucket())):
+            bucket["calls"] += 1
+            bucket["estimated_calls"] += int(estimated)
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            bucket["cost_usd"] += cost
+        if price is None:
+            self.by_model[model_key]["unpriced"] = True
+
+    @property
+    def total_tokens(self) -> int:
+        return self.total["prompt_tokens"] + self.total["completion_tokens"]
+
+    def fraction_used(self) -> Optional[float]:
+        fractions = []
+        if self.max_tokens:
+            fractions.append(self.total_tokens / self.max_tokens)
+        if self.max_cost_usd:
+            fractions.append(self.total["cost_usd"] / self.max_cost_usd)
+        return max(fractions) if fractions else None
+
+    @property
+    def near_limit(self) -> bool:
+        fraction = self.fraction_used()
+        return fraction is not None and fraction >= USAGE_BUDGET_SOFT_LIMIT
+
+    @property
+    def exhausted(self) -> bool:
+        fraction = self.fraction_used()
+        return fraction is not None and fraction >= 1.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        def rounded(bucket: Dict[str, Any]) -> Dict[str, Any]:
+            return {**bucket, "total_tokens": bucket["prompt_tokens"] + bucket["completion_tokens"], "cost_usd": round(bucket["cost_usd"], 6)}
+
+        fraction = self.fraction_used()
+        return {
+            "total": rounded(self.total),
+            "by_role": {role: rounded(bucket) for role, bucket in self.by_role.items()},
+            "by_model": {model: rounded(bucket) for model, bucket in self.by_model.items()},
+            "budget": {"max_tokens": self.max_tokens, "max_cost_usd": self.max_cost_usd, "fraction_used": round(fraction, 3) if fraction is not None else None},
+            "degraded": self.near_limit,
+        }
+
+current_usage: ContextVar[Optional[UsageTracker]] = ContextVar("current_usage", default=None)
+
+def record_usage(role: Optional[str], model_config: Dict[str, Any], messages: list[dict], completion: str, provider_usage: Dict[str, int]):
+    tracker = current_usage.get()
+    if tracker is None: return
+    estimated = "prompt_tokens" not in provider_usage or "completion_tokens" not in provider_usage
+    prompt_tokens = provider_usage.get("prompt_tokens")
+    completion_tokens = provider_usage.get("completion_tokens")
+    tracker.record(
+        role, model_config,
+        prompt_tokens if prompt_tokens is not None else estimate_message_tokens(messages),
+        completion_tokens if completion_tokens is not None else estimate_tokens(completion),
+        estimated
+    )
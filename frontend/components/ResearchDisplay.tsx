@@ -139,9 +139,19 @@ export function ResearchDisplay() {
                 setCurrentStep(prev => prev ? { ...prev, details: { ...prev.details, queries: data.queries } } : null);
                 break;
             }
+            case 'speculation': {
+                const data = event.data as { adopted: boolean; search_queries?: number };
+                if (!data.adopted && data.search_queries) incrementGoogleApiUsage(data.search_queries);
+                break;
+            }
             case 'urls_found': {
                 const data = event.data as { urls: string[] };
-                setCurrentStep(prev => prev ? { ...prev, details: { ...prev.details, urls: data.urls, summaries: [] } } : null);
+                setCurrentStep(prev => {
+                    if (!prev) return null;
+                    const knownUrls = prev.details.urls || [];
+                    const newUrls = data.urls.filter(url => !knownUrls.includes(url));
+                    return { ...prev, details: { ...prev.details, urls: [...knownUrls, ...newUrls], summaries: prev.details.summaries || [] } };
+                });
                 break;
             }
             case 'summary_complete': {
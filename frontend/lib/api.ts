@@ -74,6 +74,8 @@ interface StreamCallbacks {
     onError: (error: string) => void;
 }
 
+const MAX_STREAM_RECONNECTS = 5;
+
 export async function startResearchStream(
     query: string, 
     modelConfigs: Record<AgentModelName, ModelConfig>, 
@@ -82,59 +84,130 @@ export async function startResearchStream(
     signal: AbortSignal,
     researchHistory?: HistoryStep[]
 ): Promise<void> {
-    try {
-        const response = await fetch(`${API_BASE_URL}/v1/prism/research/stream`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                query, 
-                model_configs: modelConfigs, 
-                clarification_mode: clarificationMode,
-                research_history: researchHistory 
-            }),
-            signal,
-        });
-
-        if (!response.ok || !response.body) {
-            throw new Error(`Server error: ${response.statusText}`);
+    let lastEventId: string | null = null;
+    let finished = false;
+    let reconnects = 0;
+    // Compact streams refer back by URL to the summary most recently sent in full for that URL.
+    const summariesByUrl = new Map<string, SummarizedContent>();
+
+    const resolveSummaryRefs = (event: StreamEvent) => {
+        const remember = (summary: SummarizedContent) => {
+            if (typeof summary.url === 'string') summariesByUrl.set(summary.url, summary);
+        };
+        if (event.event === 'summary_complete') {
+            remember(event.data as SummarizedContent);
+            return;
+        }
+        const data = event.data as { summaries?: (SummarizedContent | { ref: string })[] };
+        if (data && Array.isArray(data.summaries)) {
+            data.summaries = data.summaries.map(item => {
+                if ('ref' in item) return summariesByUrl.get(item.ref) ?? item;
+                remember(item);
+                return item;
+            });
+        }
+    };
+
+    // The server keeps a run going across reconnects, so an abort has to tell it to stop spending quota.
+    signal.addEventListener('abort', () => {
+        if (finished || !lastEventId) return;
+        const runId = lastEventId.split(':')[0];
+        fetch(`${API_BASE_URL}/v1/prism/research/stream/${runId}`, { method: 'DELETE', keepalive: true }).catch(() => {});
+    }, { once: true });
+
+    const handleEvent = (jsonStr: string) => {
+        try {
+            const event = JSON.parse(jsonStr) as StreamEvent;
+            resolveSummaryRefs(event);
+            if (event.event === 'complete') {
+                finished = true;
+                callbacks.onComplete(event.data as unknown as FinalReport);
+            } else if (event.event === 'error') {
+                finished = true;
+                callbacks.onError((event.data as { detail: string }).detail || 'An unknown server error occurred.');
+            } else {
+                callbacks.onEvent(event);
+            }
+        } catch (e) {
+            console.error("Failed to parse stream event JSON:", jsonStr, e);
         }
+    };
+
+    while (true) {
+        try {
+            const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+            if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+            const response = await fetch(`${API_BASE_URL}/v1/prism/research/stream`, {
+                method: 'POST',
+                headers,
+                body: JSON.stringify({ 
+                    query, 
+                    model_configs: modelConfigs, 
+                    clarification_mode: clarificationMode,
+                    research_history: researchHistory,
+                    compact_events: true
+                }),
+                signal,
+            });
+
+            if (response.status === 410) {
+                // The server no longer has this run (e.g. after a restart); resuming would mean silently starting over.
+                finished = true;
+                callbacks.onError("The research run was lost on the server. Please start the research again.");
+                return;
+            }
+            if (!response.ok || !response.body) {
+                throw new Error(`Server error: ${response.statusText}`);
+            }
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
-
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-
-            buffer += decoder.decode(value, { stream: true });
-            const lines = buffer.split('\n\n');
-            buffer = lines.pop() || '';
-
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    const jsonStr = line.substring(6);
-                    try {
-                        const event = JSON.parse(jsonStr) as StreamEvent;
-                        if (event.event === 'complete') {
-                            callbacks.onComplete(event.data as unknown as FinalReport);
-                        } else if (event.event === 'error') {
-                            callbacks.onError((event.data as { detail: string }).detail || 'An unknown server error occurred.');
-                        } else {
-                            callbacks.onEvent(event);
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop() || '';
+
+                for (const frame of frames) {
+                    const dataLines: string[] = [];
+                    for (const line of frame.split('\n')) {
+                        if (line.startsWith('id: ')) {
+                            lastEventId = line.substring(4);
+                        } else if (line === 'event: end') {
+                            finished = true;
+                        } else if (line.startsWith('data: ')) {
+                            dataLines.push(line.substring(6));
                         }
-                    } catch (e) {
-                        console.error("Failed to parse stream event JSON:", jsonStr, e);
                     }
+                    if (dataLines.length > 0) handleEvent(dataLines.join('\n'));
                 }
             }
+            reconnects = 0;
+            if (finished || !lastEventId) return;
+        } catch (error) {
+            if (error instanceof DOMException && error.name === 'AbortError') {
+                console.log("Research stream aborted.");
+                return;
+            }
+            if (finished) return;
+            if (!lastEventId || reconnects >= MAX_STREAM_RECONNECTS) {
+                const errorMessage = error instanceof Error ? error.message : "An unknown network error occurred.";
+                callbacks.onError(errorMessage);
+                return;
+            }
         }
-    } catch (error) {
-        if (error instanceof DOMException && error.name === 'AbortError') {
-            console.log("Research stream aborted.");
+
+        reconnects += 1;
+        if (reconnects > MAX_STREAM_RECONNECTS) {
+            callbacks.onError("Lost connection to the research stream.");
             return;
         }
-        const errorMessage = error instanceof Error ? error.message : "An unknown network error occurred.";
-        callbacks.onError(errorMessage);
+        console.warn(`Research stream interrupted. Resuming from event ${lastEventId} (attempt ${reconnects}/${MAX_STREAM_RECONNECTS}).`);
+        await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** (reconnects - 1), 8000)));
     }
-}
\ No newline at end of file
+}